@@ -2,13 +2,14 @@ import os
 from flask import Flask, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO
+from app.jwt_cache import CachingJWTManager
+from app.socket_queue import message_queue_options
 
 # Initialize extensions
 db = SQLAlchemy()
 bcrypt = Bcrypt()
-jwt = JWTManager()
+jwt = CachingJWTManager()
 socketio = SocketIO(cors_allowed_origins=["http://localhost:3000", "http://localhost:3001"])
 
 
@@ -20,7 +21,36 @@ def create_app():
     db.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
-    socketio.init_app(app)
+    socketio.init_app(app, **message_queue_options(
+        app.config['SOCKETIO_MESSAGE_QUEUE'], app.config['SOCKETIO_CHANNEL']
+    ))
+
+    from app.deck import candidate_queue
+    candidate_queue.init_app(app)
+
+    from app.activity import activity_tracker
+    activity_tracker.init_app(app)
+
+    from app.exclusions import exclusion_sets
+    exclusion_sets.init_app(app)
+
+    from app.blocks import block_list
+    block_list.init_app(app)
+
+    from app.boosts import boost_queue
+    boost_queue.init_app(app)
+
+    from app.stats import user_stats_counter
+    user_stats_counter.init_app(app)
+
+    from app.history import view_history
+    view_history.init_app(app)
+
+    from app.chat_writer import chat_writer
+    chat_writer.init_app(app)
+
+    from app.presence import presence
+    presence.init_app(app)
 
     # Resolve path to the 'uploads' folder (relative to the project root)
     uploads_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'uploads'))
@@ -53,5 +83,9 @@ def create_app():
     app.register_blueprint(chat_bp, url_prefix='/chat')
     app.register_blueprint(collaboration_bp, url_prefix='/collaboration')
 
+    # Offline jobs, run with `flask build-recommendations`
+    from app.recommendations import build_recommendations_command
+    app.cli.add_command(build_recommendations_command)
+
     return app
 
@@ -0,0 +1,118 @@
+import atexit
+import threading
+import time
+
+from flask_jwt_extended import get_jwt_identity
+
+from app import db
+from app.ranking import skill_index
+
+# Minimum number of seconds between two last_active writes for the same user
+WRITE_INTERVAL = 5 * 60
+
+# Seconds between two flushes of the pending writes to the database
+FLUSH_INTERVAL = 30
+
+# Users active within this many days form the pool that candidate queries draw from
+ACTIVE_POOL_DAYS = 30
+
+
+class ActivityTracker:
+    """
+    Keeps users.last_active up to date without a write per request. Authenticated requests mark
+    their user as seen; a user is written at most once every WRITE_INTERVAL seconds, and the
+    pending writes of all users go to the database together in one UPDATE every FLUSH_INTERVAL.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._written = {}  # user id -> when their last write was scheduled
+        self._pending = {}  # user id -> last_active (epoch seconds) to write on the next flush
+        self._worker_started = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.after_request(self._after_request)
+        atexit.register(self._flush_on_exit)
+
+    def touch(self, user_id):
+        """Record that `user_id` is active right now."""
+        now = time.time()
+        with self._lock:
+            if now - self._written.get(user_id, 0) < WRITE_INTERVAL:
+                return
+            self._written[user_id] = now
+            self._pending[user_id] = now
+            if not self._worker_started:
+                self._worker_started = True
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def flush(self):
+        """Write all pending last_active values in one statement. Returns the number of users written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            # Users not seen for a whole interval can be written again on their next request
+            cutoff = time.time() - WRITE_INTERVAL
+            self._written = {user_id: at for user_id, at in self._written.items() if at >= cutoff}
+        if not pending:
+            return 0
+
+        # Sorted so concurrent flushes from several workers lock rows in the same order
+        user_ids = sorted(pending)
+        seen_at = [pending[user_id] for user_id in user_ids]
+        query = """
+        UPDATE users u
+        SET last_active = to_timestamp(v.seen_at)::timestamp
+        FROM unnest(CAST(:user_ids AS INTEGER[]), CAST(:seen_at AS DOUBLE PRECISION[])) AS v(user_id, seen_at)
+        WHERE u.id = v.user_id
+          AND (u.last_active IS NULL OR u.last_active < to_timestamp(v.seen_at)::timestamp);
+        """
+        try:
+            db.session.execute(query, {'user_ids': user_ids, 'seen_at': seen_at})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Keep the values for the next flush, unless the user was seen again in the meantime
+            with self._lock:
+                for user_id, at in pending.items():
+                    self._pending.setdefault(user_id, at)
+            raise
+
+        skill_index.update_last_active(user_ids, seen_at)
+        return len(user_ids)
+
+    def _after_request(self, response):
+        try:
+            user_id = get_jwt_identity()
+        except RuntimeError:
+            # Route without @jwt_required()
+            return response
+        if user_id is not None:
+            self.touch(int(user_id))
+        return response
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                with self.app.app_context():
+                    written = self.flush()
+                if written:
+                    print(f"[DEBUG] Updated last_active of {written} users.")
+            except Exception as e:
+                print(f"[ERROR] Failed to update last_active: {e}")
+
+    def _flush_on_exit(self):
+        if not self._pending or self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"[ERROR] Failed to update last_active on shutdown: {e}")
+
+
+activity_tracker = ActivityTracker()
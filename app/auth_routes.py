@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app import db, bcrypt
 from flask_jwt_extended import create_access_token
+from app.activity import activity_tracker
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -42,6 +43,7 @@ def login():
     if user and bcrypt.check_password_hash(user['password_hash'], password):
         # Generate JWT access token
         access_token = create_access_token(identity=str(user['id']))
+        activity_tracker.touch(user['id'])
         return jsonify({'access_token': access_token}), 200
 
     return jsonify({'message': 'Invalid username or password'}), 401
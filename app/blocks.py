@@ -0,0 +1,270 @@
+import threading
+import time
+
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity
+from pyroaring import BitMap
+
+from app import db
+
+# Seconds between two reloads of every block, which picks up blocks made through other processes
+BLOCK_SYNC_INTERVAL = 60
+
+# Rows read per round trip when loading the blocks
+LOAD_CHUNK_SIZE = 10000
+
+# Responses of the block and mute routes: (added, removed, not found)
+BLOCK_MESSAGES = {
+    'block': ('User blocked.', 'User unblocked.', 'User is not blocked.'),
+    'mute': ('User muted.', 'User unmuted.', 'User is not muted.'),
+}
+
+
+class BlockList:
+    """
+    In-process copy of the user_blocks table (see migrations/009_user_blocks.sql), as one Roaring
+    bitmap per user of the users they blocked or were blocked by, and one of the users they muted.
+    Most users have no blocks at all, so for them every check is a single dictionary miss and adds
+    nothing to the deck or to chat delivery.
+
+    Bitmaps are replaced rather than changed in place, so readers never take the lock. A reload
+    reads the table without holding it and swaps the result in under it, replaying the pairs this
+    process changed while the reload was running so they are not lost.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._worker_started = False
+        self._blocked = {}  # user id -> users they blocked or were blocked by
+        self._muted = {}  # user id -> users they muted
+        self._changed = None  # (user id, other id) -> rows applied while a reload runs, else None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    def is_blocked(self, user_id, other_id):
+        """True if either user blocked the other."""
+        self._ensure_loaded()
+        blocked = self._blocked.get(user_id)
+        return blocked is not None and other_id in blocked
+
+    def is_muted(self, user_id, other_id):
+        """True if `user_id` muted `other_id`."""
+        self._ensure_loaded()
+        muted = self._muted.get(user_id)
+        return muted is not None and other_id in muted
+
+    def blocked(self, user_id):
+        """Bitmap of the users `user_id` blocked or was blocked by, or None if there are none."""
+        self._ensure_loaded()
+        return self._blocked.get(user_id)
+
+    def hidden(self, user_id):
+        """Bitmap of the users kept out of the decks and likes of `user_id`, or None if there are none."""
+        self._ensure_loaded()
+        blocked = self._blocked.get(user_id)
+        muted = self._muted.get(user_id)
+        if blocked is None:
+            return muted
+        if muted is None:
+            return blocked
+        return blocked | muted
+
+    def block(self, blocker_id, blocked_id, kind):
+        """
+        Record that `blocker_id` blocked or muted (`kind`) `blocked_id`. Muting a blocked user keeps
+        the block. Returns False if `blocked_id` does not exist.
+        """
+        query = """
+        INSERT INTO user_blocks (blocker_id, blocked_id, kind)
+        SELECT :blocker_id, id, :kind FROM users WHERE id = :blocked_id
+        ON CONFLICT (blocker_id, blocked_id) DO UPDATE
+        SET kind = CASE WHEN user_blocks.kind = 'block' THEN 'block' ELSE EXCLUDED.kind END
+        RETURNING blocked_id;
+        """
+        row = db.session.execute(query, {'blocker_id': blocker_id, 'blocked_id': blocked_id, 'kind': kind}).fetchone()
+        db.session.commit()
+        if row is None:
+            return False
+        self._refresh_pair(blocker_id, blocked_id)
+        return True
+
+    def unblock(self, blocker_id, blocked_id, kind):
+        """Remove a block or mute (`kind`). Returns False if there was none."""
+        query = """
+        DELETE FROM user_blocks
+        WHERE blocker_id = :blocker_id AND blocked_id = :blocked_id AND kind = :kind
+        RETURNING blocked_id;
+        """
+        row = db.session.execute(query, {'blocker_id': blocker_id, 'blocked_id': blocked_id, 'kind': kind}).fetchone()
+        db.session.commit()
+        if row is None:
+            return False
+        self._refresh_pair(blocker_id, blocked_id)
+        return True
+
+    def list_blocked(self, blocker_id, kind):
+        """The users `blocker_id` blocked or muted (`kind`), most recent first."""
+        query = """
+        SELECT u.id, u.username, u.profile_picture, b.created_at
+        FROM user_blocks b
+        JOIN users u ON u.id = b.blocked_id
+        WHERE b.blocker_id = :blocker_id AND b.kind = :kind
+        ORDER BY b.created_at DESC, u.id DESC;
+        """
+        users = db.session.execute(query, {'blocker_id': blocker_id, 'kind': kind}).fetchall()
+        return [
+            {'id': user[0], 'username': user[1], 'profile_picture': user[2], 'since': user[3].isoformat()}
+            for user in users
+        ]
+
+    def _refresh_pair(self, user_id, other_id):
+        """Re-read the blocks between two users after this process changed them."""
+        query = """
+        SELECT blocker_id, blocked_id, kind
+        FROM user_blocks
+        WHERE (blocker_id = :user_id AND blocked_id = :other_id)
+           OR (blocker_id = :other_id AND blocked_id = :user_id);
+        """
+        rows = db.session.execute(query, {'user_id': user_id, 'other_id': other_id}).fetchall()
+        with self._lock:
+            if not self._loaded:
+                return
+            _apply_pair(self._blocked, self._muted, user_id, other_id, rows)
+            if self._changed is not None:
+                self._changed[(user_id, other_id)] = rows
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._blocked, self._muted = self._load()
+            self._loaded = True
+        if not self._worker_started:
+            self._worker_started = True
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _load(self):
+        started = time.time()
+        blocked = {}
+        muted = {}
+        connection = db.engine.connect().execution_options(stream_results=True)
+        try:
+            result = connection.execute("SELECT blocker_id, blocked_id, kind FROM user_blocks;")
+            while True:
+                rows = result.fetchmany(LOAD_CHUNK_SIZE)
+                if not rows:
+                    break
+                for blocker_id, blocked_id, kind in rows:
+                    if kind == 'block':
+                        blocked.setdefault(blocker_id, BitMap()).add(blocked_id)
+                        blocked.setdefault(blocked_id, BitMap()).add(blocker_id)
+                    else:
+                        muted.setdefault(blocker_id, BitMap()).add(blocked_id)
+        finally:
+            connection.close()
+        print(f"[DEBUG] Loaded blocks of {len(blocked)} users and mutes of {len(muted)} users in {time.time() - started:.2f}s.")
+        return blocked, muted
+
+    def _reload(self):
+        """Read every block again without holding the lock, then swap the result in."""
+        with self._lock:
+            self._changed = {}
+        try:
+            blocked, muted = self._load()
+        except Exception:
+            with self._lock:
+                self._changed = None
+            raise
+        with self._lock:
+            for (user_id, other_id), rows in self._changed.items():
+                _apply_pair(blocked, muted, user_id, other_id, rows)
+            self._blocked = blocked
+            self._muted = muted
+            self._changed = None
+
+    def _run(self):
+        while True:
+            time.sleep(BLOCK_SYNC_INTERVAL)
+            try:
+                with self.app.app_context():
+                    self._reload()
+            except Exception as e:
+                print(f"[ERROR] Failed to reload blocks: {e}")
+
+
+def _apply_pair(blocked, muted, user_id, other_id, rows):
+    """Make the bitmaps of two users match `rows`, the user_blocks rows between them."""
+    is_blocked = any(row[2] == 'block' for row in rows)
+    mutes = {(row[0], row[1]) for row in rows if row[2] == 'mute'}
+    _set(blocked, user_id, other_id, is_blocked)
+    _set(blocked, other_id, user_id, is_blocked)
+    _set(muted, user_id, other_id, (user_id, other_id) in mutes)
+    _set(muted, other_id, user_id, (other_id, user_id) in mutes)
+
+
+def _set(index, user_id, other_id, present):
+    """Add or remove `other_id` in the bitmap of `user_id`, replacing the bitmap instead of changing it."""
+    current = index.get(user_id)
+    if present == (current is not None and other_id in current):
+        return
+    updated = BitMap(current) if current is not None else BitMap()
+    if present:
+        updated.add(other_id)
+    else:
+        updated.discard(other_id)
+    if updated:
+        index[user_id] = updated
+    else:
+        del index[user_id]
+
+
+block_list = BlockList()
+
+
+def add_block(user_id, kind):
+    """Route body shared by the block and mute routes of every blueprint."""
+    current_user_id = int(get_jwt_identity())
+    if user_id == current_user_id:
+        return jsonify({'message': f'You cannot {kind} yourself.'}), 400
+
+    try:
+        if not block_list.block(current_user_id, user_id, kind):
+            return jsonify({'message': 'User not found'}), 404
+        print(f"[DEBUG] User {current_user_id} added a {kind} on user {user_id}.")
+        return jsonify({'message': BLOCK_MESSAGES[kind][0]}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to {kind} user {user_id} for user ID {current_user_id}: {e}")
+        return jsonify({'message': f'Failed to {kind} user.'}), 500
+
+
+def remove_block(user_id, kind):
+    """Route body shared by the unblock and unmute routes of every blueprint."""
+    current_user_id = int(get_jwt_identity())
+    try:
+        if not block_list.unblock(current_user_id, user_id, kind):
+            return jsonify({'message': BLOCK_MESSAGES[kind][2]}), 404
+        print(f"[DEBUG] User {current_user_id} removed the {kind} on user {user_id}.")
+        return jsonify({'message': BLOCK_MESSAGES[kind][1]}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to un{kind} user {user_id} for user ID {current_user_id}: {e}")
+        return jsonify({'message': f'Failed to un{kind} user.'}), 500
+
+
+def list_blocks(kind):
+    """Route body shared by the blocked and muted users lists of every blueprint."""
+    current_user_id = int(get_jwt_identity())
+    label = 'blocked users' if kind == 'block' else 'muted users'
+    try:
+        return jsonify({label.replace(' ', '_'): block_list.list_blocked(current_user_id, kind)}), 200
+    except Exception as e:
+        print(f"[ERROR] Failed to fetch {label} for user ID {current_user_id}: {e}")
+        return jsonify({'message': f'Failed to fetch {label}.'}), 500
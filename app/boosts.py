@@ -0,0 +1,174 @@
+import heapq
+import math
+import threading
+import time
+
+from app import db
+
+# Default and longest boost, in minutes
+BOOST_DURATION_MINUTES = 30
+MAX_BOOST_DURATION_MINUTES = 180
+
+# Minutes after which a boost has decayed to half its weight
+BOOST_HALF_LIFE_MINUTES = 10
+
+# Seconds between two reads of the boosts started through other processes
+BOOST_SYNC_INTERVAL = 30
+
+# Seconds of boosts re-read on every sync, so boosts committed by slow transactions are not missed
+BOOST_SYNC_MARGIN = 60
+
+# Rebuild the heap once this share of its entries has expired
+COMPACT_RATIO = 0.5
+
+_DECAY_RATE = math.log(2) / (BOOST_HALF_LIFE_MINUTES * 60)
+
+
+def boost_key(weight, started_at):
+    """
+    Heap key of a boost. The decayed score of a boost is weight * exp(-rate * (now - started_at));
+    since every boost decays at the same rate, comparing two scores at any time is the same as
+    comparing log(weight) + rate * started_at, which never changes. The heap is therefore keyed
+    once, on insert, and never re-sorted as time passes.
+    """
+    return -(math.log(weight) + _DECAY_RATE * started_at)
+
+
+class BoostQueue:
+    """
+    Active profile boosts, as a min-heap on boost_key (best boost first). Decks read the best few
+    boosts with top(), which walks the heap from the root without popping, so it costs
+    O(k log k) for k boosts however many boosts are active. Expired boosts are skipped on read
+    and dropped when they reach the root or when enough of them pile up.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._heap = []  # (key, boost id, user id, expires at, card)
+        self._boost_ids = set()  # ids of the boosts in the heap
+        self._synced_at = None  # database time of the last sync
+        self._top = (None, 0, 0, [])  # (version, k, valid until, cards) of the last top() result
+        self._loaded = False
+        self._load_lock = threading.Lock()  # held while the first sync runs
+        self._worker_started = False
+        self.version = 0  # bumped whenever a boost is added, so decks know when to look again
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    def add(self, boost_id, user_id, weight, started_at, expires_at, card):
+        """Add a boost started by this process (times in epoch seconds)."""
+        self._ensure_loaded()
+        with self._lock:
+            self._push(boost_id, user_id, weight, started_at, expires_at, card)
+
+    def top(self, k):
+        """Return the cards of the `k` best active boosts, best first."""
+        self._ensure_loaded()
+        now = time.time()
+        with self._lock:
+            # Every deck asks for the same list until a boost starts or one of the listed boosts ends
+            version, top_k, valid_until, cards = self._top
+            if version == self.version and top_k == k and now < valid_until:
+                return cards
+
+            heap = self._heap
+            while heap and heap[0][3] <= now:
+                self._drop_root()
+
+            cards = []
+            seen = set()
+            valid_until = math.inf
+            frontier = [(heap[0][0], 0)] if heap else []
+            while frontier and len(cards) < k:
+                _, i = heapq.heappop(frontier)
+                _, _, user_id, expires_at, card = heap[i]
+                if expires_at > now and user_id not in seen:
+                    seen.add(user_id)
+                    cards.append(card)
+                    valid_until = min(valid_until, expires_at)
+                for child in (2 * i + 1, 2 * i + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child][0], child))
+            self._top = (self.version, k, valid_until, cards)
+            return cards
+
+    def _push(self, boost_id, user_id, weight, started_at, expires_at, card):
+        if boost_id in self._boost_ids:
+            return
+        heapq.heappush(self._heap, (boost_key(weight, started_at), boost_id, user_id, expires_at, card))
+        self._boost_ids.add(boost_id)
+        self.version += 1
+
+    def _drop_root(self):
+        _, boost_id, _, _, _ = heapq.heappop(self._heap)
+        self._boost_ids.discard(boost_id)
+
+    def _compact(self):
+        """Drop every expired boost once they make up a large share of the heap."""
+        now = time.time()
+        with self._lock:
+            expired = sum(1 for entry in self._heap if entry[3] <= now)
+            if expired < COMPACT_RATIO * len(self._heap):
+                return
+            self._heap = [entry for entry in self._heap if entry[3] > now]
+            heapq.heapify(self._heap)
+            self._boost_ids = {entry[1] for entry in self._heap}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        # Callers wait for the first load instead of reading an empty heap; a failed load is retried
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._sync()
+            self._loaded = True
+            if not self._worker_started:
+                self._worker_started = True
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def _sync(self):
+        """Load the active boosts started since the last sync, including those of other processes."""
+        query = f"""
+        SELECT b.id, b.user_id, b.weight, b.started_at, b.expires_at,
+               u.username, u.bio, u.skills, u.location, u.profile_picture,
+               LOCALTIMESTAMP
+        FROM profile_boosts b
+        JOIN users u ON u.id = b.user_id
+        WHERE b.expires_at > LOCALTIMESTAMP
+          {"AND b.started_at >= CAST(:since AS TIMESTAMP) - make_interval(secs => :margin)" if self._synced_at else ""};
+        """
+        boosts = db.session.execute(query, {'since': self._synced_at, 'margin': BOOST_SYNC_MARGIN}).fetchall()
+        if not boosts:
+            self._synced_at = db.session.execute("SELECT LOCALTIMESTAMP;").scalar()
+            return
+        with self._lock:
+            for boost in boosts:
+                card = {
+                    'id': boost[1],
+                    'username': boost[5],
+                    'bio': boost[6],
+                    'skills': boost[7],
+                    'location': boost[8],
+                    'profile_picture': boost[9],
+                }
+                self._push(boost[0], boost[1], boost[2], boost[3].timestamp(), boost[4].timestamp(), card)
+            self._synced_at = boosts[0][10]
+
+    def _run(self):
+        while True:
+            time.sleep(BOOST_SYNC_INTERVAL)
+            try:
+                with self.app.app_context():
+                    self._sync()
+                    db.session.rollback()
+                self._compact()
+            except Exception as e:
+                print(f"[ERROR] Failed to sync profile boosts: {e}")
+
+
+boost_queue = BoostQueue()
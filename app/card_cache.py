@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Most profile cards kept in memory; the least recently used one is dropped beyond this
+CARD_CACHE_SIZE = 10000
+
+# Seconds a cached card is served for. Changes made through another worker process are only
+# invalidated in that process, so this also bounds how stale a card can get.
+CARD_CACHE_TTL = 60
+
+
+class ProfileCardCache:
+    """
+    Read-through cache of the profile cards served by /match/get_user, keyed by user id. Only the
+    parts of a card that are the same for every viewer are cached. Routes that change a user's
+    profile, collections or collaboration memberships invalidate that user's card.
+
+    A card read from the database is only cached if no invalidation happened since the read
+    started: callers take generation() before the read and pass it to put(), so an invalidation
+    landing between the two cannot be undone by caching the card it made stale.
+    """
+
+    def __init__(self, max_size=CARD_CACHE_SIZE, ttl=CARD_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._cards = OrderedDict()  # user id -> (expires at, card)
+        self._generation = 0  # number of invalidations so far
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the cached card of `user_id`, or None on a miss."""
+        with self._lock:
+            entry = self._cards.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._cards[user_id]
+                return None
+            self._cards.move_to_end(user_id)
+            return entry[1]
+
+    def generation(self):
+        """Token to take before reading a card from the database, and to pass to put()."""
+        with self._lock:
+            return self._generation
+
+    def put(self, user_id, card, generation):
+        """Cache `card`, unless an invalidation happened since `generation` was taken."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._cards[user_id] = (time.time() + self.ttl, card)
+            self._cards.move_to_end(user_id)
+            while len(self._cards) > self.max_size:
+                self._cards.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._cards.pop(int(user_id), None)
+
+
+profile_cards = ProfileCardCache()
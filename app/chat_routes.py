@@ -1,82 +1,480 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, session
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db, socketio
-from flask_socketio import emit, join_room, leave_room
+from flask_socketio import emit, join_room, leave_room, ConnectionRefusedError
+from app.blocks import block_list
+from app.presence import presence, presence_room, MAX_WATCHED_USERS
+from app.utils import get_user_id_from_token, encode_cursor, decode_time_cursor, inbox_room, conversation_id
+from app.chat_writer import chat_writer, ChatWriterBusy
 
 chat_bp = Blueprint('chat', __name__)
 
+# Number of messages returned by /chat/history per page, and the largest page a client may ask for
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+
+# Number of conversations returned by /chat/conversations per page, and the largest page a client may ask for
+CONVERSATION_PAGE_SIZE = 20
+MAX_CONVERSATION_PAGE_SIZE = 100
+
+# Number of messages returned by /chat/sync and the 'sync' event per reply, and the largest reply a client may ask for
+SYNC_PAGE_SIZE = 200
+MAX_SYNC_PAGE_SIZE = 500
+
 # Route to fetch chat history
 @chat_bp.route('/history/<int:receiver_id>', methods=['GET'])
 @jwt_required()
 def get_chat_history(receiver_id):
-    sender_id = get_jwt_identity()
-    print(f"[DEBUG] Fetching chat history: sender_id={sender_id}, receiver_id={receiver_id}")
+    """
+    Fetch one page of the conversation with `receiver_id`, oldest message first. The first page holds
+    the newest `limit` (optional) messages; pass the returned next_before as `before` to get the
+    messages sent before them.
+    """
+    sender_id = int(get_jwt_identity())
+    before = request.args.get('before', type=int)
+    limit = request.args.get('limit', default=HISTORY_PAGE_SIZE, type=int)
+    print(f"[DEBUG] Fetching chat history: sender_id={sender_id}, receiver_id={receiver_id}, before={before}")
+
+    if limit < 1:
+        return jsonify({'message': 'limit must be positive'}), 400
+    limit = min(limit, MAX_HISTORY_PAGE_SIZE)
+
+    if block_list.is_blocked(sender_id, receiver_id):
+        return jsonify({'message': 'User is blocked.'}), 403
 
-    # Fetch chat history between sender_id and receiver_id
-    chat_history_query = """
-    SELECT sender_id, message, timestamp
+    # One range scan of the conversation index (see migrations/014_chat_history_index.sql)
+    chat_history_query = f"""
+    SELECT id, sender_id, message, sent_at
     FROM chats
-    WHERE (sender_id = :sender_id AND receiver_id = :receiver_id)
-       OR (sender_id = :receiver_id AND receiver_id = :sender_id)
-    ORDER BY timestamp;
+    WHERE LEAST(sender_id, receiver_id) = :low_id
+      AND GREATEST(sender_id, receiver_id) = :high_id
+      {"AND (sent_at, id) < (SELECT sent_at, id FROM chats WHERE id = :before)" if before else ""}
+    ORDER BY sent_at DESC, id DESC
+    LIMIT :limit;
     """
-    messages = db.session.execute(chat_history_query, {'sender_id': sender_id, 'receiver_id': receiver_id}).fetchall()
+    try:
+        messages = db.session.execute(chat_history_query, {
+            'low_id': min(sender_id, receiver_id),
+            'high_id': max(sender_id, receiver_id),
+            'before': before,
+            'limit': limit + 1,
+        }).fetchall()
+    except Exception as e:
+        print(f"[ERROR] Failed to fetch chat history between {sender_id} and {receiver_id}: {e}")
+        return jsonify({'message': 'Failed to fetch chat history.'}), 500
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
 
     chat_history = [
-        {'sender_id': msg[0], 'message': msg[1], 'timestamp': msg[2].isoformat()}
-        for msg in messages
+        {
+            'id': msg[0],
+            'sender_id': msg[1],
+            'message': msg[2],
+            'timestamp': msg[3].isoformat() if msg[3] else None,
+        }
+        for msg in reversed(messages)
+    ]
+    next_before = chat_history[0]['id'] if has_more else None
+
+    print(f"[DEBUG] Retrieved {len(chat_history)} messages between {sender_id} and {receiver_id}.")
+    return jsonify({'messages': chat_history, 'next_before': next_before}), 200
+
+@chat_bp.route('/conversations', methods=['GET'])
+@jwt_required()
+def get_conversations():
+    """
+    Fetch one page of the current user's conversations, most recently active first, with their last
+    message and unread count. Pass the returned next_cursor as `cursor` to get the following page.
+    """
+    current_user_id = int(get_jwt_identity())
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', default=CONVERSATION_PAGE_SIZE, type=int)
+
+    if limit < 1:
+        return jsonify({'message': 'limit must be positive'}), 400
+    limit = min(limit, MAX_CONVERSATION_PAGE_SIZE)
+
+    try:
+        before_at, before_id = decode_time_cursor(cursor) if cursor else (None, None)
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    try:
+        # Conversations with blocked users stay in the table but are not listed
+        blocked = block_list.blocked(current_user_id)
+
+        # Read one page of the user's conversation rows (see migrations/015_conversations.sql)
+        conversations_query = f"""
+        SELECT c.other_id, u.username, u.profile_picture, c.last_message_id, c.last_sender_id,
+               m.message, c.last_sent_at, c.unread_count, c.last_read_message_id
+        FROM conversations c
+        JOIN users u ON u.id = c.other_id
+        LEFT JOIN chats m ON m.id = c.last_message_id
+        WHERE c.user_id = :current_user_id
+          {"AND (c.last_sent_at, c.other_id) < (CAST(:before_at AS TIMESTAMP), :before_id)" if cursor else ""}
+          {"AND c.other_id <> ALL(:blocked_ids)" if blocked else ""}
+        ORDER BY c.last_sent_at DESC, c.other_id DESC
+        LIMIT :limit;
+        """
+        conversations = db.session.execute(conversations_query, {
+            'current_user_id': current_user_id,
+            'before_at': before_at,
+            'before_id': before_id,
+            'blocked_ids': list(blocked) if blocked else None,
+            'limit': limit + 1,
+        }).fetchall()
+
+        has_more = len(conversations) > limit
+        conversations = conversations[:limit]
+
+        conversations_data = [
+            {
+                'conversation_id': conversation_id(current_user_id, row[0]),
+                'user': {'id': row[0], 'username': row[1], 'profile_picture': row[2]},
+                'last_message': {
+                    'id': row[3],
+                    'sender_id': row[4],
+                    'message': row[5],
+                    'timestamp': row[6].isoformat(),
+                },
+                'unread_count': row[7],
+                'last_read_message_id': row[8],
+            }
+            for row in conversations
+        ]
+        next_cursor = (
+            encode_cursor([conversations_data[-1]['last_message']['timestamp'], conversations_data[-1]['user']['id']])
+            if has_more else None
+        )
+
+        print(f"[DEBUG] Retrieved {len(conversations_data)} conversations for user ID {current_user_id}.")
+        return jsonify({'conversations': conversations_data, 'next_cursor': next_cursor}), 200
+
+    except Exception as e:
+        print(f"[ERROR] Failed to fetch conversations for user ID {current_user_id}: {e}")
+        return jsonify({'message': 'Failed to fetch conversations.'}), 500
+
+
+@chat_bp.route('/conversations/<int:other_id>/read', methods=['POST'])
+@jwt_required()
+def mark_conversation_read(other_id):
+    """Mark every message of the conversation with `other_id` as read by the current user."""
+    current_user_id = int(get_jwt_identity())
+    try:
+        read_query = """
+        UPDATE conversations
+        SET unread_count = 0, last_read_message_id = last_message_id
+        WHERE user_id = :current_user_id AND other_id = :other_id
+        RETURNING last_read_message_id;
+        """
+        row = db.session.execute(read_query, {'current_user_id': current_user_id, 'other_id': other_id}).fetchone()
+        db.session.commit()
+
+        if row is None:
+            return jsonify({'message': 'Conversation not found'}), 404
+
+        # Let the user's other connections clear their unread badge too
+        socketio.emit('conversation_read', {
+            'conversation_id': conversation_id(current_user_id, other_id),
+            'last_read_message_id': row[0],
+        }, to=inbox_room(current_user_id))
+
+        print(f"[DEBUG] User {current_user_id} read their conversation with user {other_id}.")
+        return jsonify({'message': 'Conversation marked as read.', 'last_read_message_id': row[0]}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to mark conversation with user {other_id} read for user ID {current_user_id}: {e}")
+        return jsonify({'message': 'Failed to mark conversation as read.'}), 500
+
+
+@chat_bp.route('/sync', methods=['GET'])
+@jwt_required()
+def sync_messages():
+    """
+    Fetch the messages of every conversation of the current user that were stored after `since`,
+    oldest first, at most `limit` (optional) of them. Pass the returned next_since as `since` again
+    until has_more is false. Without `since`, no messages are returned and next_since is the
+    user's current position, to start syncing from.
+    """
+    current_user_id = int(get_jwt_identity())
+    since = request.args.get('since', type=int)
+    limit = request.args.get('limit', default=SYNC_PAGE_SIZE, type=int)
+
+    if limit < 1:
+        return jsonify({'message': 'limit must be positive'}), 400
+
+    try:
+        result = messages_since(current_user_id, since, min(limit, MAX_SYNC_PAGE_SIZE))
+    except Exception as e:
+        print(f"[ERROR] Failed to sync messages for user ID {current_user_id} since {since}: {e}")
+        return jsonify({'message': 'Failed to sync messages.'}), 500
+
+    return jsonify(result), 200
+
+
+def messages_since(user_id, since, limit):
+    """
+    Messages sent or received by `user_id` whose seq is greater than `since`, in seq order, as a
+    dict with messages, next_since and has_more. seq is the commit order of chats (see
+    migrations/016_chat_sync.sql), so a client that resumes from next_since misses nothing, even
+    messages whose id is lower than one it already has. Messages of blocked users are left out.
+    """
+    if since is None:
+        # Every message stored later gets a larger seq than the user's last committed one
+        position_query = """
+        SELECT GREATEST(
+            (SELECT MAX(seq) FROM chats WHERE receiver_id = :user_id),
+            (SELECT MAX(seq) FROM chats WHERE sender_id = :user_id)
+        );
+        """
+        position = db.session.execute(position_query, {'user_id': user_id}).scalar()
+        return {'messages': [], 'next_since': position or 0, 'has_more': False}
+
+    blocked = block_list.blocked(user_id)
+
+    # Two range scans, over the (receiver_id, seq) and (sender_id, seq) indexes
+    sync_query = f"""
+    SELECT id, seq, sender_id, receiver_id, message, sent_at
+    FROM (
+        (SELECT id, seq, sender_id, receiver_id, message, sent_at
+         FROM chats
+         WHERE receiver_id = :user_id AND seq > :since
+           {"AND sender_id <> ALL(:blocked_ids)" if blocked else ""}
+         ORDER BY seq
+         LIMIT :limit)
+        UNION ALL
+        (SELECT id, seq, sender_id, receiver_id, message, sent_at
+         FROM chats
+         WHERE sender_id = :user_id AND seq > :since AND receiver_id <> :user_id
+           {"AND receiver_id <> ALL(:blocked_ids)" if blocked else ""}
+         ORDER BY seq
+         LIMIT :limit)
+    ) m
+    ORDER BY seq
+    LIMIT :limit;
+    """
+    rows = db.session.execute(sync_query, {
+        'user_id': user_id,
+        'since': since,
+        'blocked_ids': list(blocked) if blocked else None,
+        'limit': limit + 1,
+    }).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    messages = [
+        {
+            'id': row[0],
+            'seq': row[1],
+            'conversation_id': conversation_id(row[2], row[3]),
+            'sender_id': row[2],
+            'receiver_id': row[3],
+            'message': row[4],
+            'timestamp': row[5].isoformat() if row[5] else None,
+        }
+        for row in rows
     ]
+    next_since = messages[-1]['seq'] if messages else since
+
+    print(f"[DEBUG] Synced {len(messages)} messages for user ID {user_id} since {since}.")
+    return {'messages': messages, 'next_since': next_since, 'has_more': has_more}
 
-    print(f"[DEBUG] Retrieved chat history: {chat_history}")
-    return jsonify(chat_history), 200
 
 # WebSocket events for real-time messaging
+@socketio.on('connect')
+def handle_connect(auth=None):
+    """
+    Authenticate the connection once and subscribe it to its user's inbox room, so it receives the
+    messages of every conversation of that user without joining one room per conversation. The
+    access token is sent as the `token` field of the Socket.IO auth payload (or a `token` query
+    parameter). The user id is kept in the connection's session for the events that follow.
+    """
+    token = auth.get('token') if isinstance(auth, dict) else None
+    token = token or request.args.get('token')
+    if not token:
+        raise ConnectionRefusedError('Missing access token.')
+
+    try:
+        user_id = int(get_user_id_from_token(token))
+    except Exception as e:
+        print(f"[DEBUG] Refused socket connection with an invalid token: {e}")
+        raise ConnectionRefusedError('Invalid access token.')
+
+    session['user_id'] = user_id
+    join_room(inbox_room(user_id))
+    presence.connect(user_id, request.sid)
+    print(f"[DEBUG] User {user_id} connected to their inbox.")
+
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    presence.disconnect(request.sid)
+    print(f"[DEBUG] User {session.get('user_id')} disconnected.")
+
+
+@socketio.on('heartbeat')
+def handle_heartbeat(data=None):
+    """
+    Sent by the client while it is in the foreground, at least once every PRESENCE_TTL seconds
+    (see app/presence.py); a connection that stops sending them goes offline.
+    """
+    presence.heartbeat(session['user_id'], request.sid)
+
+
+@socketio.on('presence')
+def handle_presence(data):
+    """
+    Follow the presence of `user_ids`, replacing the users this connection followed before. The
+    reply is a 'presence' event per user with their current state; later online / offline changes
+    arrive as 'presence' events too. Only connections to this worker count as online: with several
+    workers the events carry exact=False, and an offline state may be wrong (see app/presence.py).
+    """
+    user_id = session['user_id']
+    try:
+        user_ids = {int(other_id) for other_id in (data or {}).get('user_ids') or []}
+    except (TypeError, ValueError):
+        emit('error', {'message': 'user_ids must be a list of integers'})
+        return
+    if len(user_ids) > MAX_WATCHED_USERS:
+        emit('error', {'message': f'At most {MAX_WATCHED_USERS} users can be followed'})
+        return
+    # Blocked users neither see nor are seen
+    user_ids = {other_id for other_id in user_ids if not block_list.is_blocked(user_id, other_id)}
+
+    for other_id in set(session.get('watching', ())) - user_ids:
+        leave_room(presence_room(other_id))
+    for other_id in user_ids:
+        join_room(presence_room(other_id))
+    session['watching'] = list(user_ids)
+
+    online = presence.online(user_ids)
+    for other_id in user_ids:
+        emit('presence', {'user_id': other_id, 'online': other_id in online, 'exact': presence.exact})
+
+
+@socketio.on('typing')
+def handle_typing(data):
+    """
+    Tell `receiver_id` that the user started (`typing` true) or stopped typing to them. Clients may
+    send this on every keystroke: at most one start per TYPING_INTERVAL seconds is forwarded, and
+    a sender who goes quiet for TYPING_IDLE seconds is sent as stopped. Nothing is stored.
+    """
+    sender_id = session['user_id']
+    try:
+        receiver_id = int(data['receiver_id'])
+    except (KeyError, TypeError, ValueError):
+        emit('error', {'message': 'receiver_id is required'})
+        return
+    typing = bool(data.get('typing', True))
+
+    if block_list.is_blocked(sender_id, receiver_id) or block_list.is_muted(receiver_id, sender_id):
+        return
+    presence.typing(sender_id, receiver_id, typing)
+
+
 @socketio.on('join')
 def handle_join(data):
-    room = data['room']
-    print(f"[DEBUG] Joining room: {room}")
-    join_room(room)
-    emit('status', {'message': f"User joined room: {room}"}, room=room)
+    """Deprecated: messages of every conversation already reach the connection through its inbox."""
+    print(f"[DEBUG] User {session['user_id']} asked to join room: {data.get('room')}")
+    emit('status', {'message': 'Messages of every conversation are delivered to your inbox.'})
 
 
 @socketio.on('leave')
 def handle_leave(data):
-    room = data['room']
-    user_id = get_jwt_identity()
-    print(f"[DEBUG] User {user_id} is attempting to leave room: {room}")
-    leave_room(room)
-    print(f"[DEBUG] User {user_id} successfully left room: {room}")
-    emit('status', {'message': f"User {user_id} has left the room."}, room=room)
+    """Deprecated counterpart of 'join'."""
+    print(f"[DEBUG] User {session['user_id']} asked to leave room: {data.get('room')}")
+    emit('status', {'message': 'Messages of every conversation are delivered to your inbox.'})
+
+
+@socketio.on('sync')
+def handle_sync(data=None):
+    """
+    Socket counterpart of GET /chat/sync, for a client catching up after a reconnect. Takes
+    `since` and `limit` (both optional) and replies to this connection only with a 'sync' event.
+    Messages pushed live carry no seq, since they are not stored yet; the client keeps the
+    next_since of its last sync reply and drops messages whose id it already has.
+    """
+    user_id = session['user_id']
+    data = data if isinstance(data, dict) else {}
+    try:
+        since = int(data['since']) if data.get('since') is not None else None
+        limit = int(data.get('limit') or SYNC_PAGE_SIZE)
+    except (TypeError, ValueError):
+        emit('error', {'message': 'since and limit must be integers'})
+        return
+    if limit < 1:
+        emit('error', {'message': 'limit must be positive'})
+        return
+
+    try:
+        result = messages_since(user_id, since, min(limit, MAX_SYNC_PAGE_SIZE))
+    except Exception as e:
+        print(f"[ERROR] Failed to sync messages for user ID {user_id} since {since}: {e}")
+        emit('error', {'message': 'Failed to sync messages.'})
+        return
+
+    emit('sync', result)
 
 
 @socketio.on('message')
 def handle_message(data):
-    sender_id = data['sender_id']
-    receiver_id = data['receiver_id']
-    room = data['room']
-    message = data['message']
+    # The sender is the user the connection authenticated as, never a client-supplied id
+    sender_id = session['user_id']
+    data = data if isinstance(data, dict) else {}
+    message = data.get('message')
+
+    # A message the database would reject is refused here, before it is broadcast and queued
+    try:
+        if isinstance(data.get('receiver_id'), bool):
+            raise TypeError('receiver_id is a boolean')
+        receiver_id = int(data['receiver_id'])
+    except (KeyError, TypeError, ValueError):
+        emit('error', {'message': 'receiver_id must be a user id.'})
+        return
+    if not isinstance(message, str) or not message.strip():
+        emit('error', {'message': 'message must be a non-empty string.'})
+        return
 
     print(f"[DEBUG] Received message from sender_id: {sender_id} to receiver_id: {receiver_id}")
-    print(f"[DEBUG] Room: {room}")
     print(f"[DEBUG] Message content: {message}")
 
-    # Save message to the database
-    insert_query = """
-    INSERT INTO chats (sender_id, receiver_id, message)
-    VALUES (:sender_id, :receiver_id, :message);
-    """
+    if not chat_writer.user_exists(receiver_id):
+        emit('error', {'message': 'User not found.'})
+        return
+
+    # Messages between blocked users are neither stored nor delivered
+    if block_list.is_blocked(sender_id, receiver_id):
+        print(f"[DEBUG] Dropped message from {sender_id} to {receiver_id}: blocked.")
+        emit('error', {'message': 'User is blocked.'})
+        return
+
+    # Queue the message for the background writer instead of committing it here (see app/chat_writer.py)
     try:
-        db.session.execute(insert_query, {'sender_id': sender_id, 'receiver_id': receiver_id, 'message': message})
-        db.session.commit()
-        print(f"[DEBUG] Message saved to database from {sender_id} to {receiver_id}")
-    except Exception as e:
-        print(f"[ERROR] Failed to save message to database: {e}")
+        chat = chat_writer.submit(sender_id, receiver_id, message)
+    except ChatWriterBusy:
+        print(f"[ERROR] Chat write queue is full, refused message from {sender_id} to {receiver_id}")
+        emit('error', {'message': 'Server is busy, please resend the message.'})
+        return
 
-    # Emit the message to the room
-    emit('message', {
+    payload = {
+        'id': chat['id'],
+        'conversation_id': conversation_id(sender_id, receiver_id),
         'sender_id': sender_id,
         'receiver_id': receiver_id,
         'message': message,
-        # 'timestamp': str(datetime.now())  # Include timestamp for the message
-    }, room=room)
-    print(f"[DEBUG] Message broadcasted to room: {room}")
+        'timestamp': chat['sent_at'],
+    }
+
+    # A receiver who muted the sender still gets the message in their history, but it is only
+    # pushed to the sender's connections
+    if block_list.is_muted(receiver_id, sender_id):
+        emit('message', payload, to=inbox_room(sender_id))
+        print(f"[DEBUG] Message not pushed to {receiver_id}: sender is muted.")
+        return
+
+    # Every connection of both users gets the message through their inbox
+    emit('message', payload, to=[inbox_room(sender_id), inbox_room(receiver_id)])
+    print(f"[DEBUG] Message delivered to the inboxes of {sender_id} and {receiver_id}.")
@@ -0,0 +1,258 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app import db
+
+# Most messages waiting to be written; senders wait (and are eventually refused) beyond this
+MAX_PENDING_MESSAGES = 10000
+
+# Seconds a sender waits for room in a full queue before its message is refused
+ENQUEUE_TIMEOUT = 0.5
+
+# Most messages written per INSERT, and the longest a message waits for others to share its batch
+WRITE_BATCH_SIZE = 500
+WRITE_BATCH_WAIT = 0.02
+
+# Seconds between two attempts to write a batch the database refused, doubling up to the maximum
+RETRY_BACKOFF = 0.5
+MAX_RETRY_BACKOFF = 30
+
+# Number of message ids reserved from the chats id sequence per round trip
+ID_BLOCK_SIZE = 100
+
+# Most user ids remembered as existing, so checking a receiver rarely needs a query
+KNOWN_USERS_SIZE = 50000
+
+
+class ChatWriterBusy(Exception):
+    """The write queue stayed full for ENQUEUE_TIMEOUT seconds."""
+
+
+class ChatWriter:
+    """
+    Write-behind pipeline for socket chat messages. A message gets its id from a block reserved
+    ahead of time from the chats id sequence and goes into a bounded queue, so the socket handler
+    can broadcast it right away; a background writer drains the queue and stores up to
+    WRITE_BATCH_SIZE messages per INSERT and commit.
+
+    Delivery to the database is at least once: a batch that fails is retried until it is written,
+    inserts skip ids that are already stored, and on shutdown whatever could not be written is
+    appended to a spool file in CHAT_SPOOL_DIR, which the next process to start writes back.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.spool_dir = None
+        self._queue = queue.Queue(maxsize=MAX_PENDING_MESSAGES)
+        self._lock = threading.Lock()
+        self._ids = iter(())  # ids left in the reserved block
+        self._known_users = OrderedDict()  # user ids seen in the users table, least recently used first
+        self._in_flight = []  # batch the writer is working on
+        self._stopping = False
+        self._worker_started = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.spool_dir = app.config.get('CHAT_SPOOL_DIR')
+        atexit.register(self._spool_on_exit)
+        if self.spool_dir and glob.glob(os.path.join(self.spool_dir, '*.jsonl')):
+            self._start_worker()
+
+    def submit(self, sender_id, receiver_id, message):
+        """
+        Queue a message for writing and return it as a dict with its id and sent_at (ISO 8601, no
+        time zone). That string is written to chats.sent_at as is, so the timestamp emitted with a
+        message is the one its history shows.
+        Raises ChatWriterBusy if the queue stays full, so the sender can be told to retry.
+        """
+        chat = {
+            'id': self._next_id(),
+            'sender_id': sender_id,
+            'receiver_id': receiver_id,
+            'message': message,
+            'sent_at': datetime.now().isoformat(),
+        }
+        try:
+            self._queue.put(chat, timeout=ENQUEUE_TIMEOUT)
+        except queue.Full:
+            raise ChatWriterBusy() from None
+        self._start_worker()
+        return chat
+
+    def user_exists(self, user_id):
+        """
+        Whether `user_id` is a user, so a message to anyone else is refused before it is queued
+        instead of failing the batch it would be written in.
+        """
+        with self._lock:
+            if user_id in self._known_users:
+                self._known_users.move_to_end(user_id)
+                return True
+        exists = db.session.execute(
+            "SELECT 1 FROM users WHERE id = :user_id;", {'user_id': user_id}
+        ).fetchone() is not None
+        if exists:
+            with self._lock:
+                self._known_users[user_id] = True
+                if len(self._known_users) > KNOWN_USERS_SIZE:
+                    self._known_users.popitem(last=False)
+        return exists
+
+    def _next_id(self):
+        with self._lock:
+            chat_id = next(self._ids, None)
+            if chat_id is None:
+                # On a connection of its own, so the caller's session and transaction are left alone
+                connection = db.engine.connect()
+                try:
+                    rows = connection.execute(
+                        text("SELECT nextval(pg_get_serial_sequence('chats', 'id')) FROM generate_series(1, :count);"),
+                        count=ID_BLOCK_SIZE
+                    ).fetchall()
+                finally:
+                    connection.close()
+                self._ids = iter([row[0] for row in rows])
+                chat_id = next(self._ids)
+            return chat_id
+
+    def _start_worker(self):
+        if self._worker_started:
+            return
+        self._worker_started = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        self._replay_spool()
+        while not self._stopping:
+            # Built in place, so a shutdown spools the batch even before the writer got to it
+            batch = self._in_flight = [self._queue.get()]
+            deadline = time.time() + WRITE_BATCH_WAIT
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+            self._write_until_stored(batch)
+            self._in_flight = []
+
+    def _write_until_stored(self, batch):
+        backoff = RETRY_BACKOFF
+        while not self._stopping:
+            try:
+                with self.app.app_context():
+                    self._write(batch)
+                return
+            except (IntegrityError, DataError) as e:
+                # Retrying cannot help a batch the database rejects; write what it accepts
+                print(f"[ERROR] Chat batch of {len(batch)} messages rejected, writing them one by one: {e.orig}")
+                self._write_one_by_one(batch)
+                return
+            except Exception as e:
+                print(f"[ERROR] Failed to write {len(batch)} chat messages, retrying in {backoff}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RETRY_BACKOFF)
+
+    def _write_one_by_one(self, batch):
+        """Write each message of `batch` on its own, dropping the ones the database rejects."""
+        with self.app.app_context():
+            for chat in batch:
+                try:
+                    self._write([chat])
+                except (IntegrityError, DataError) as e:
+                    print(f"[ERROR] Dropped chat message {chat['id']} from {chat['sender_id']} "
+                          f"to {chat['receiver_id']}: {e.orig}")
+
+    def _write(self, batch):
+        query = """
+        INSERT INTO chats (id, sender_id, receiver_id, message, sent_at)
+        SELECT v.id, v.sender_id, v.receiver_id, v.message, v.sent_at
+        FROM unnest(
+            CAST(:ids AS INTEGER[]), CAST(:sender_ids AS INTEGER[]), CAST(:receiver_ids AS INTEGER[]),
+            CAST(:messages AS TEXT[]), CAST(:sent_at AS TIMESTAMP[])
+        ) AS v(id, sender_id, receiver_id, message, sent_at)
+        ORDER BY v.id
+        ON CONFLICT (id) DO NOTHING;
+        """
+        try:
+            db.session.execute(query, {
+                'ids': [chat['id'] for chat in batch],
+                'sender_ids': [chat['sender_id'] for chat in batch],
+                'receiver_ids': [chat['receiver_id'] for chat in batch],
+                'messages': [chat['message'] for chat in batch],
+                'sent_at': [chat['sent_at'] for chat in batch],
+            })
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _replay_spool(self):
+        """Write back the messages spooled by processes that stopped before writing them."""
+        if not self.spool_dir:
+            return
+        for path in glob.glob(os.path.join(self.spool_dir, '*.jsonl')):
+            # Claim the file, so two starting processes do not both replay it
+            claimed = f"{path}.replay-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed) as spool:
+                batch = [json.loads(line) for line in spool if line.strip()]
+            for chat in batch:
+                # Spooled by an older process, as epoch seconds
+                if isinstance(chat['sent_at'], (int, float)):
+                    chat['sent_at'] = datetime.fromtimestamp(chat['sent_at']).isoformat()
+            for start in range(0, len(batch), WRITE_BATCH_SIZE):
+                self._write_until_stored(batch[start:start + WRITE_BATCH_SIZE])
+            if self._stopping:
+                os.rename(claimed, path)
+                return
+            os.remove(claimed)
+            print(f"[DEBUG] Replayed {len(batch)} spooled chat messages from {path}.")
+
+    def _spool_on_exit(self):
+        """Write what is still queued, or spool it to disk if the database does not take it."""
+        self._stopping = True
+        pending = list(self._in_flight)
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not pending or self.app is None:
+            return
+
+        try:
+            with self.app.app_context():
+                self._write(pending)
+            return
+        except Exception as e:
+            print(f"[ERROR] Failed to write {len(pending)} chat messages on shutdown, spooling them: {e}")
+
+        if not self.spool_dir:
+            print(f"[ERROR] CHAT_SPOOL_DIR is not set, {len(pending)} chat messages are lost.")
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"chat-{os.getpid()}-{int(time.time())}.jsonl")
+        with open(path, 'a') as spool:
+            for chat in pending:
+                spool.write(json.dumps(chat) + '\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+        print(f"[DEBUG] Spooled {len(pending)} chat messages to {path}.")
+
+
+chat_writer = ChatWriter()
@@ -7,6 +7,7 @@ import tempfile
 from botocore.config import Config as BotoConfig
 from botocore.exceptions import NoCredentialsError
 from app import db
+from app.card_cache import profile_cards
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
@@ -118,6 +119,7 @@ def create_collaboration():
         """
         db.session.execute(user_collab_query, {'user_id': user_id, 'collaboration_id': collaboration_id})
         db.session.commit()
+        profile_cards.invalidate(user_id)
 
         return jsonify({'message': 'Collaboration created successfully', 'id': collaboration_id, 'profile_picture_url': profile_picture_url}), 201
     except Exception as e:
@@ -163,6 +165,12 @@ def edit_collaboration(collaboration_id):
             db.session.execute(update_query, update_values)
             db.session.commit()
 
+            # The name and description are shown on every member's profile card
+            if name or description:
+                members_query = "SELECT user_id FROM user_collaborations WHERE collaboration_id = :collaboration_id;"
+                members = db.session.execute(members_query, {'collaboration_id': collaboration_id}).fetchall()
+                profile_cards.invalidate(*[member[0] for member in members])
+
         return jsonify({'message': 'Collaboration updated successfully.'}), 200
     except Exception as e:
         print(f"[ERROR] Failed to update collaboration: {e}")
@@ -430,10 +438,13 @@ def handle_collaboration_request(request_id):
             INSERT INTO user_collaborations (user_id, collaboration_id, role)
             SELECT cr.user_id, cr.collaboration_id, 'member'
             FROM collaboration_requests cr
-            WHERE cr.id = :request_id;
+            WHERE cr.id = :request_id
+            RETURNING user_id;
             """
-            db.session.execute(user_collab_query, {'request_id': request_id})
+            added = db.session.execute(user_collab_query, {'request_id': request_id}).fetchone()
             db.session.commit()
+            if added:
+                profile_cards.invalidate(added[0])
 
         return jsonify({'message': f'Request has been {status} successfully.'}), 200
     except Exception as e:
@@ -571,12 +582,6 @@ def remove_member_from_collaboration(collaboration_id):
     """Remove a member from a collaboration."""
     return jsonify({'message': 'Member removed from collaboration.'}), 200
 
-@collaboration_bp.route('/<int:collaboration_id>/remove-member', methods=['POST'])
-@jwt_required()
-def remove_member_from_collaboration(collaboration_id):
-    """Remove a member from a collaboration."""
-    return jsonify({'message': 'Member removed from collaboration.'}), 200
-
 @collaboration_bp.route('/<int:collaboration_id>/make-admin', methods=['POST'])
 @jwt_required()
 def make_member_admin(collaboration_id):
@@ -45,6 +45,27 @@ class Config:
     print(f"[DEBUG] Raw CORS_ORIGINS from environment: {os.getenv('CORS_ORIGINS')}")
     print(f"[DEBUG] Processed CORS_ORIGINS: {CORS_ORIGINS}")
 
+    # Also append swipes to the legacy users.swipe_right array (see migrations/001_create_swipes.sql)
+    SWIPE_ARRAY_DUAL_WRITE = os.getenv("SWIPE_ARRAY_DUAL_WRITE", "false").lower() == "true"
+    print(f"[DEBUG] SWIPE_ARRAY_DUAL_WRITE: {SWIPE_ARRAY_DUAL_WRITE}")
+
+    # Where the in-memory deck exclusion sets are snapshotted for warm restarts (see app/exclusions.py),
+    # one file per worker suffixed .0, .1, ...; set to an empty value to disable snapshots
+    EXCLUSION_SNAPSHOT_PATH = os.getenv("EXCLUSION_SNAPSHOT_PATH", "exclusions.snapshot")
+    print(f"[DEBUG] EXCLUSION_SNAPSHOT_PATH: {EXCLUSION_SNAPSHOT_PATH}")
+
+    # Where chat messages that could not be written before shutdown are spooled, and replayed from
+    # on the next start (see app/chat_writer.py); set to an empty value to disable the spool
+    CHAT_SPOOL_DIR = os.getenv("CHAT_SPOOL_DIR", "chat_spool")
+    print(f"[DEBUG] CHAT_SPOOL_DIR: {CHAT_SPOOL_DIR}")
+
+    # Message queue shared by every Socket.IO worker, so emits reach clients connected to any of them
+    # (see app/socket_queue.py): e.g. redis://localhost:6379/0, or local:// within one process.
+    # Leave empty to run a single worker.
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+    SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "synergy-socketio")
+    print(f"[DEBUG] SOCKETIO_MESSAGE_QUEUE: {SOCKETIO_MESSAGE_QUEUE}")
+
     # Debug mode
     DEBUG = os.getenv("FLASK_ENV") != "production"
     print(f"[DEBUG] FLASK_ENV: {os.getenv('FLASK_ENV')}")
@@ -0,0 +1,363 @@
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+from app import db
+from app.activity import ACTIVE_POOL_DAYS
+from app.blocks import block_list
+from app.boosts import boost_queue
+from app.exclusions import exclusion_sets
+from app.ranking import skill_index
+
+# Number of candidates kept per deck, and the size below which a refill is scheduled
+QUEUE_SIZE = 60
+LOW_WATER_MARK = 20
+
+# Number of eligible users read and scored at once; the ones not added to the deck right away
+# wait in ranked order for the next refills
+RANKING_WINDOW = 1000
+
+# Most boosted cards put in a deck at once, and how many of the best boosts are looked at to find them
+BOOSTS_PER_INJECTION = 3
+BOOST_SCAN = 50
+
+# Fewest ids read per round trip while looking for candidates that pass the exclusion sets
+MIN_SCAN_WINDOW = 500
+
+# Most users whose decks are kept in memory; the least recently used one is dropped beyond this
+MAX_DECK_USERS = 10000
+
+# Seconds to wait before refilling a deck again once it ran out of candidates
+EXHAUSTED_BACKOFF = 30
+
+
+def fetch_deck_page(current_user_id, collaboration_id, after_id, limit):
+    """Fetch the cards of the users returned by fetch_deck_ids."""
+    return fetch_cards(fetch_deck_ids(current_user_id, collaboration_id, after_id, limit))
+
+
+def fetch_deck_ids(current_user_id, collaboration_id, after_id, limit):
+    """
+    Fetch the ids of up to `limit` users with an id greater than `after_id` that the current user
+    has not swiped on or matched with, in id order, optionally restricted to the members of a
+    collaboration. Outside a collaboration only the active pool (users active in the last
+    ACTIVE_POOL_DAYS days) is considered.
+
+    Ids are read in windows and filtered against the user's in-memory exclusion set, so the
+    database only walks an index instead of probing swipes and matches for every candidate.
+    """
+    window = max(2 * limit, MIN_SCAN_WINDOW)
+    deck_ids = []
+    while len(deck_ids) < limit:
+        scanned = _scan_ids(current_user_id, collaboration_id, after_id, window)
+        deck_ids.extend(exclusion_sets.filter(current_user_id, scanned)[:limit - len(deck_ids)])
+        if len(scanned) < window:
+            break
+        after_id = scanned[-1]
+    return deck_ids
+
+
+def _scan_ids(current_user_id, collaboration_id, after_id, limit):
+    """Fetch the next `limit` ids of possible candidates after `after_id`, before exclusions."""
+    if collaboration_id:
+        query = """
+        SELECT uc.user_id
+        FROM user_collaborations uc
+        WHERE uc.collaboration_id = :collaboration_id
+          AND uc.user_id > :after_id
+          AND uc.user_id != :current_user_id
+        ORDER BY uc.user_id
+        LIMIT :limit;
+        """
+    else:
+        query = """
+        SELECT u.id
+        FROM users u
+        WHERE u.last_active >= LOCALTIMESTAMP - make_interval(days => :active_days)
+          AND u.id > :after_id
+          AND u.id != :current_user_id
+        ORDER BY u.id
+        LIMIT :limit;
+        """
+
+    rows = db.session.execute(query, {
+        'collaboration_id': collaboration_id,
+        'current_user_id': current_user_id,
+        'after_id': after_id,
+        'active_days': ACTIVE_POOL_DAYS,
+        'limit': limit,
+    }).fetchall()
+    return [row[0] for row in rows]
+
+
+def fetch_cards(user_ids):
+    """Fetch the swipe cards of the given users, in the order of `user_ids`."""
+    if not user_ids:
+        return []
+    query = """
+    SELECT id, username, bio, skills, location, profile_picture
+    FROM users
+    WHERE id = ANY(:user_ids);
+    """
+    users = db.session.execute(query, {'user_ids': list(user_ids)}).fetchall()
+    cards = {
+        user[0]: {
+            'id': user[0],
+            'username': user[1],
+            'bio': user[2],
+            'skills': user[3],
+            'location': user[4],
+            'profile_picture': user[5],
+        }
+        for user in users
+    }
+    return [cards[user_id] for user_id in user_ids if user_id in cards]
+
+
+class _Deck:
+    """Precomputed candidates of one user, in general or within one collaboration."""
+
+    def __init__(self):
+        self.cards = deque()
+        self.ids = set()
+        self.after_id = 0  # keyset position of the next window to rank, None once the last one was read
+        self.ranked = deque()  # ranked ids of the windows read so far, best first, not in the deck yet
+        self.refill_lock = threading.Lock()  # one refill of the deck at a time
+        self.exhausted_at = None
+        self.popped = set()  # ids swiped while a refill was running
+        self.boost_version = None  # boost_queue.version when boosts were last injected
+
+
+class CandidateQueue:
+    """
+    Keeps a short list of the next candidates for every active user (and every collaboration
+    they browse), so /match/get_others reads the head of a list instead of running the deck query.
+    Swipes pop candidates off the list and a background worker tops it up from the database
+    once it falls below the low-water mark. Eligible users are read and scored RANKING_WINDOW at
+    a time; a refill takes the best ones not served yet, so every user of a window ends up in the
+    deck before the next window is read.
+    Boosted profiles (see app/boosts.py) go ahead of the ranked candidates, both on refills and
+    at the head of the deck whenever a new boost started since the user last looked.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._decks = OrderedDict()
+        self._lock = threading.Lock()
+        self._refills = queue.Queue()
+        self._pending = set()
+        self._worker_started = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    def peek(self, user_id, collaboration_id, count, served=()):
+        """
+        Return the first `count` candidates of the user's deck, skipping the ids in `served` (the
+        cards already returned to the client). Skipping by id rather than by position keeps a page
+        right while swipes take cards off the head and boosts and refills add some.
+        """
+        key = (user_id, collaboration_id)
+        with self._lock:
+            deck = self._get_deck(key)
+
+        # First visit: fill the deck inline so the first response is not empty
+        if deck is None:
+            deck = _Deck()
+            self._refill(key, deck)
+            with self._lock:
+                deck = self._decks.setdefault(user_id, {}).setdefault(collaboration_id, deck)
+                self._evict()
+
+        # Drop users blocked or muted since the deck was filled
+        hidden = block_list.hidden(user_id)
+
+        # Put newly boosted profiles in front when the user starts going through their deck
+        boosted = []
+        if not served and collaboration_id is None and deck.boost_version != boost_queue.version:
+            deck.boost_version = boost_queue.version
+            boosted = self._boosted_cards(user_id, deck)
+
+        cards = self._collect(deck, count, served, hidden, boosted)
+        if len(cards) < count and self._can_refill(deck):
+            # Served everything in the deck (or the background refill has not caught up): add the
+            # next candidates now rather than end the page short
+            self._refill(key, deck, count - len(cards))
+            cards = self._collect(deck, count, served, hidden, ())
+        with self._lock:
+            if len(deck.cards) < LOW_WATER_MARK and self._can_refill(deck):
+                self._schedule_refill(key)
+        return cards
+
+    def _collect(self, deck, count, served, hidden, boosted):
+        """First `count` cards of `deck` not in `served`, after dropping `hidden` and adding `boosted`."""
+        with self._lock:
+            if hidden is not None and not deck.ids.isdisjoint(hidden):
+                deck.cards = deque(card for card in deck.cards if card['id'] not in hidden)
+                deck.ids = {card['id'] for card in deck.cards}
+            for card in reversed(boosted):
+                if card['id'] not in deck.ids and card['id'] not in deck.popped:
+                    deck.cards.appendleft(card)
+                    deck.ids.add(card['id'])
+            cards = []
+            for card in deck.cards:
+                if len(cards) == count:
+                    break
+                if card['id'] not in served:
+                    cards.append(card)
+            return cards
+
+    def queued(self, user_id, collaboration_id, user_ids):
+        """The ids among `user_ids` that are still in the user's deck."""
+        with self._lock:
+            deck = self._get_deck((user_id, collaboration_id))
+            if deck is None:
+                return []
+            return [candidate_id for candidate_id in user_ids if candidate_id in deck.ids]
+
+    def resume_id(self, user_id, collaboration_id):
+        """
+        Id from which an id ordered walk reaches every eligible user the deck has not put in yet:
+        before its waiting ranked ids, or where it stopped reading, or 0 once it read them all.
+        """
+        with self._lock:
+            deck = self._get_deck((user_id, collaboration_id))
+            if deck is None:
+                return 0
+            if deck.ranked:
+                return min(deck.ranked) - 1
+            return deck.after_id or 0
+
+    def pop(self, user_id, target_ids):
+        """Drop swiped (or matched) users from every deck of `user_id`."""
+        with self._lock:
+            user_decks = self._decks.get(user_id, {})
+            for collaboration_id, deck in user_decks.items():
+                for target_id in target_ids:
+                    deck.popped.add(target_id)
+                    if target_id not in deck.ids:
+                        continue
+                    deck.ids.discard(target_id)
+                    if deck.cards and deck.cards[0]['id'] == target_id:
+                        deck.cards.popleft()
+                    else:
+                        deck.cards = deque(card for card in deck.cards if card['id'] != target_id)
+                if len(deck.cards) < LOW_WATER_MARK:
+                    self._schedule_refill((user_id, collaboration_id))
+
+    def restore(self, user_id, card):
+        """
+        Put `card` back at the head of the general deck of `user_id`, after a swipe on it was undone.
+        Decks of other processes get it back from a refill, once their exclusion set caught up.
+        """
+        with self._lock:
+            deck = self._get_deck((user_id, None))
+            if deck is None:
+                return
+            deck.popped.discard(card['id'])
+            if card['id'] not in deck.ids:
+                deck.cards.appendleft(card)
+                deck.ids.add(card['id'])
+
+    def _boosted_cards(self, user_id, deck):
+        """The best boosted cards `user_id` has not seen in this deck, swiped on, matched or blocked."""
+        cards = [card for card in boost_queue.top(BOOST_SCAN) if card['id'] != user_id and card['id'] not in deck.ids]
+        if not cards:
+            return []
+        allowed = set(exclusion_sets.filter(user_id, [card['id'] for card in cards]))
+        return [card for card in cards if card['id'] in allowed][:BOOSTS_PER_INJECTION]
+
+    def _get_deck(self, key):
+        user_id, collaboration_id = key
+        user_decks = self._decks.get(user_id)
+        if user_decks is None:
+            return None
+        self._decks.move_to_end(user_id)
+        return user_decks.get(collaboration_id)
+
+    def _evict(self):
+        while len(self._decks) > MAX_DECK_USERS:
+            self._decks.popitem(last=False)
+
+    def _can_refill(self, deck):
+        """Whether a refill may add cards now: candidates are left, or the exhausted backoff is over."""
+        if deck.ranked or deck.after_id is not None:
+            return True
+        return not deck.exhausted_at or time.time() - deck.exhausted_at >= EXHAUSTED_BACKOFF
+
+    def _schedule_refill(self, key):
+        """Queue a background refill of the deck at `key`. The caller holds _lock."""
+        if key in self._pending:
+            return
+        self._pending.add(key)
+        self._refills.put(key)
+        if not self._worker_started:
+            self._worker_started = True
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            key = self._refills.get()
+            with self._lock:
+                self._pending.discard(key)
+                deck = self._get_deck(key)
+            if deck is None:
+                continue
+            try:
+                with self.app.app_context():
+                    self._refill(key, deck)
+            except Exception as e:
+                print(f"[ERROR] Failed to refill candidate queue for {key}: {e}")
+
+    def _refill(self, key, deck, at_least=0):
+        """Top the deck up to QUEUE_SIZE cards, adding at least `at_least` new ones."""
+        user_id, collaboration_id = key
+        with deck.refill_lock:
+            with self._lock:
+                if not self._can_refill(deck):
+                    return
+                missing = max(QUEUE_SIZE - len(deck.cards), at_least)
+                deck.popped.clear()
+                if deck.after_id is None and not deck.ranked:
+                    # Every eligible user was read: start over from the lowest id
+                    deck.after_id = 0
+            if missing <= 0:
+                return
+
+            picked = []
+            while len(picked) < missing and (deck.ranked or deck.after_id is not None):
+                if not deck.ranked:
+                    # Rank the whole next window; what does not fit in the deck waits in deck.ranked
+                    candidate_ids = fetch_deck_ids(user_id, collaboration_id, deck.after_id, RANKING_WINDOW)
+                    fresh_ids = [candidate_id for candidate_id in candidate_ids if candidate_id not in deck.ids]
+                    ranked = skill_index.rank(user_id, fresh_ids, len(fresh_ids))
+                    with self._lock:
+                        deck.ranked.extend(ranked)
+                        deck.after_id = candidate_ids[-1] if len(candidate_ids) == RANKING_WINDOW else None
+                    continue
+                with self._lock:
+                    taken = [deck.ranked.popleft() for _ in range(min(missing - len(picked), len(deck.ranked)))]
+                # Swiped on since they were ranked
+                allowed = set(exclusion_sets.filter(user_id, taken))
+                picked.extend(candidate_id for candidate_id in taken if candidate_id in allowed)
+
+            cards = fetch_cards(picked)
+            if collaboration_id is None:
+                cards = self._boosted_cards(user_id, deck) + cards
+            db.session.rollback()
+
+            with self._lock:
+                for card in cards:
+                    if card['id'] not in deck.ids and card['id'] not in deck.popped:
+                        deck.cards.append(card)
+                        deck.ids.add(card['id'])
+                if deck.after_id is None and not deck.ranked:
+                    deck.exhausted_at = time.time()
+                else:
+                    deck.exhausted_at = None
+
+
+candidate_queue = CandidateQueue()
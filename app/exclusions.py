@@ -0,0 +1,255 @@
+import atexit
+import fcntl
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from pyroaring import BitMap
+
+from app import db
+from app.blocks import block_list
+
+# Most users whose exclusion sets are kept in memory; the least recently used one is dropped beyond this
+MAX_EXCLUSION_USERS = 50000
+
+# Seconds after which a set is caught up with swipes and matches recorded by other processes
+SYNC_INTERVAL = 60
+
+# Seconds of history re-read on every catch-up, so rows committed by slow transactions are not missed
+SYNC_MARGIN = 60
+
+# Seconds without a catch-up after which a set is read again in full, under the 7 days swipe_undos are kept
+MAX_CATCH_UP_AGE = 6 * 24 * 3600
+
+# Seconds between two snapshots of the sets to disk
+SNAPSHOT_INTERVAL = 300
+
+# Most snapshot files next to EXCLUSION_SNAPSHOT_PATH, one per worker running at the same time
+MAX_SNAPSHOT_SLOTS = 64
+
+_SNAPSHOT_MAGIC = b'SYNEXCL1'
+_RECORD_HEADER = struct.Struct('<IdI')  # user id, synced at (epoch seconds), bitmap size in bytes
+
+
+class _Entry:
+    """Exclusion set of one user, and when it was last read from / checked against the database."""
+
+    __slots__ = ('bitmap', 'synced_at', 'checked_at')
+
+    def __init__(self, bitmap, synced_at, checked_at=0):
+        self.bitmap = bitmap
+        self.synced_at = synced_at  # database time of the last read
+        self.checked_at = checked_at  # time.time() of the last read, 0 forces a catch-up
+
+
+class ExclusionSets:
+    """
+    For every active user, a compressed (Roaring) bitmap of the user ids they must not be shown
+    in their deck: users they swiped on or matched with. Candidate generation filters whole
+    windows of ids against it in one set operation instead of running anti-joins in SQL. Users
+    they blocked, were blocked by or muted are subtracted too, from the block list's bitmaps.
+
+    Sets are read from the database on first use, updated in place on every swipe, and caught
+    up incrementally every SYNC_INTERVAL seconds; a catch-up also takes out the users whose swipe
+    was undone in another process (swipe_undos, see migrations/011_undo_swipe.sql). They are
+    snapshotted to disk so a restarted process starts warm; restored sets are caught up on first
+    use like any other. Every worker locks a snapshot slot of its own (EXCLUSION_SNAPSHOT_PATH.0,
+    .1, ...) for as long as it runs, so workers never write over each other's snapshot and a
+    restarted worker picks up a free one.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.snapshot_path = None
+        self._slot_lock = None  # open lock file of the claimed snapshot slot
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker_started = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        base_path = app.config.get('EXCLUSION_SNAPSHOT_PATH')
+        self.snapshot_path = self._claim_slot(base_path) if base_path else None
+        if self.snapshot_path:
+            self.load_snapshot()
+            atexit.register(self._snapshot_on_exit)
+
+    def _claim_slot(self, base_path):
+        """Lock the first snapshot slot no other process holds and return its path."""
+        for slot in range(MAX_SNAPSHOT_SLOTS):
+            lock_file = open(f"{base_path}.{slot}.lock", 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            # Kept open: the lock is held until the process exits
+            self._slot_lock = lock_file
+            return f"{base_path}.{slot}"
+        print(f"[ERROR] All {MAX_SNAPSHOT_SLOTS} exclusion snapshot slots are in use, snapshots are disabled.")
+        return None
+
+    def filter(self, user_id, candidate_ids):
+        """Return the ids in `candidate_ids` that `user_id` may be shown, in id order."""
+        entry = self._get_entry(user_id)
+        hidden = block_list.hidden(user_id)
+        with self._lock:
+            remaining = BitMap(candidate_ids) - entry.bitmap
+        if hidden is not None:
+            remaining -= hidden
+        return list(remaining)
+
+    def add(self, user_id, excluded_ids):
+        """Exclude `excluded_ids` for `user_id`, after a swipe or match was committed."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry.bitmap.update(excluded_ids)
+
+    def remove(self, user_id, target_ids):
+        """
+        Show `target_ids` to `user_id` again, after their swipe was undone. Other processes show
+        them again on their next catch-up of `user_id`.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                for target_id in target_ids:
+                    entry.bitmap.discard(target_id)
+
+    def _get_entry(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+                if time.time() - entry.checked_at < SYNC_INTERVAL:
+                    return entry
+
+        if entry is None:
+            synced_at, excluded_ids, _ = self._read(user_id, None)
+            entry = _Entry(BitMap(excluded_ids), synced_at, time.time())
+            with self._lock:
+                entry = self._entries.setdefault(user_id, entry)
+                while len(self._entries) > MAX_EXCLUSION_USERS:
+                    self._entries.popitem(last=False)
+        else:
+            synced_at, excluded_ids, undone_ids = self._read(user_id, entry.synced_at - timedelta(seconds=SYNC_MARGIN))
+            if (synced_at - entry.synced_at).total_seconds() > MAX_CATCH_UP_AGE:
+                # Undos this old may have been pruned already, so only a full read is complete
+                synced_at, excluded_ids, undone_ids = self._read(user_id, None)
+                with self._lock:
+                    entry.bitmap = BitMap(excluded_ids)
+            with self._lock:
+                for target_id in undone_ids:
+                    entry.bitmap.discard(target_id)
+                entry.bitmap.update(excluded_ids)
+                entry.synced_at = synced_at
+                entry.checked_at = time.time()
+
+        self._start_worker()
+        return entry
+
+    def _read(self, user_id, since):
+        """
+        Read the users `user_id` swiped on or matched with (since `since`, if given) in one round
+        trip. With `since`, also read the users whose swipe was undone since then and who are not
+        swiped on or matched again.
+        """
+        undone_ids = "'{}'::INTEGER[]"
+        if since:
+            undone_ids = """ARRAY(
+                   SELECT u.target_id FROM swipe_undos u
+                   WHERE u.swiper_id = :user_id AND u.undone_at >= :since
+                     AND NOT EXISTS (SELECT 1 FROM swipes s WHERE s.swiper_id = u.swiper_id AND s.target_id = u.target_id)
+                     AND NOT EXISTS (SELECT 1 FROM match_edges m WHERE m.user_id = u.swiper_id AND m.other_id = u.target_id)
+               )"""
+        query = f"""
+        SELECT LOCALTIMESTAMP,
+               ARRAY(
+                   SELECT target_id FROM swipes
+                   WHERE swiper_id = :user_id {"AND created_at >= :since" if since else ""}
+               ),
+               ARRAY(
+                   SELECT other_id FROM match_edges
+                   WHERE user_id = :user_id {"AND matched_at >= :since" if since else ""}
+               ),
+               {undone_ids};
+        """
+        row = db.session.execute(query, {'user_id': user_id, 'since': since}).fetchone()
+        return row[0], row[1] + row[2], row[3]
+
+    def _start_worker(self):
+        if self._worker_started or not self.snapshot_path:
+            return
+        self._worker_started = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(SNAPSHOT_INTERVAL)
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                print(f"[ERROR] Failed to snapshot exclusion sets: {e}")
+
+    def save_snapshot(self):
+        """Write every set to this worker's snapshot slot, replacing its previous snapshot atomically."""
+        started = time.time()
+        with self._lock:
+            records = [
+                (user_id, entry.synced_at.timestamp(), entry.bitmap.serialize())
+                for user_id, entry in self._entries.items()
+            ]
+
+        temporary_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as snapshot:
+            snapshot.write(_SNAPSHOT_MAGIC)
+            for user_id, synced_at, data in records:
+                snapshot.write(_RECORD_HEADER.pack(user_id, synced_at, len(data)))
+                snapshot.write(data)
+        os.replace(temporary_path, self.snapshot_path)
+        print(f"[DEBUG] Saved exclusion sets of {len(records)} users in {time.time() - started:.2f}s.")
+
+    def load_snapshot(self):
+        """Restore the sets saved by save_snapshot, if a snapshot exists."""
+        if not os.path.exists(self.snapshot_path):
+            return
+        started = time.time()
+        try:
+            with open(self.snapshot_path, 'rb') as snapshot:
+                data = snapshot.read()
+            if not data.startswith(_SNAPSHOT_MAGIC):
+                print(f"[ERROR] Ignoring exclusion snapshot with unknown format: {self.snapshot_path}")
+                return
+
+            entries = OrderedDict()
+            offset = len(_SNAPSHOT_MAGIC)
+            while offset < len(data):
+                user_id, synced_at, size = _RECORD_HEADER.unpack_from(data, offset)
+                offset += _RECORD_HEADER.size
+                bitmap = BitMap.deserialize(data[offset:offset + size])
+                offset += size
+                entries[user_id] = _Entry(bitmap, datetime.fromtimestamp(synced_at))
+        except Exception as e:
+            print(f"[ERROR] Failed to load exclusion snapshot {self.snapshot_path}: {e}")
+            return
+
+        with self._lock:
+            self._entries = entries
+        print(f"[DEBUG] Loaded exclusion sets of {len(entries)} users in {time.time() - started:.2f}s.")
+
+    def _snapshot_on_exit(self):
+        if not self._entries:
+            return
+        try:
+            self.save_snapshot()
+        except Exception as e:
+            print(f"[ERROR] Failed to snapshot exclusion sets on shutdown: {e}")
+
+
+exclusion_sets = ExclusionSets()
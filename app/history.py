@@ -0,0 +1,144 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+
+from app import db
+
+# Most profiles kept in a user's recently viewed list
+RECENTLY_VIEWED_SIZE = 300
+
+# Seconds between two flushes of the buffered views to the database
+HISTORY_FLUSH_INTERVAL = 10
+
+
+class ViewHistory:
+    """
+    Recently viewed profiles of every user, stored as one capped INTEGER[] per user (see
+    migrations/013_recently_viewed.sql). /match/get_user only appends the view to an in-memory
+    buffer; every HISTORY_FLUSH_INTERVAL seconds the buffered views of all users are merged into
+    their arrays in one statement. Reads put the views this process has not written yet in front
+    of the stored list.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pending = {}  # user id -> OrderedDict of viewed id -> seen at, oldest first
+        self._worker_started = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self._flush_on_exit)
+
+    def record(self, viewer_id, viewed_id):
+        """Add `viewed_id` to the front of the recently viewed list of `viewer_id`."""
+        if viewer_id == viewed_id:
+            return
+        with self._lock:
+            views = self._pending.setdefault(viewer_id, OrderedDict())
+            views[viewed_id] = time.time()
+            views.move_to_end(viewed_id)
+            if len(views) > RECENTLY_VIEWED_SIZE:
+                views.popitem(last=False)
+            if not self._worker_started:
+                self._worker_started = True
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def recent_ids(self, user_id, limit):
+        """Ids of the profiles `user_id` viewed most recently, newest first."""
+        row = db.session.execute(
+            "SELECT viewed_ids FROM recently_viewed WHERE user_id = :user_id;", {'user_id': user_id}
+        ).fetchone()
+        with self._lock:
+            buffered = list(reversed(self._pending.get(user_id, ())))
+        if not buffered:
+            return (row[0] if row else [])[:limit]
+        seen = set(buffered)
+        stored = [viewed_id for viewed_id in (row[0] if row else []) if viewed_id not in seen]
+        return (buffered + stored)[:limit]
+
+    def flush(self):
+        """Merge all buffered views into the stored lists in one statement. Returns the number of users written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        user_ids, viewed_ids, seen_at = [], [], []
+        for user_id, views in pending.items():
+            for viewed_id, at in views.items():
+                user_ids.append(user_id)
+                viewed_ids.append(viewed_id)
+                seen_at.append(at)
+
+        # New views go in front, their older occurrences are dropped and the list is cut at the cap.
+        # Rows are written in user id order so concurrent flushes from several workers cannot deadlock.
+        query = """
+        WITH fresh AS (
+            SELECT v.user_id, array_agg(v.viewed_id ORDER BY v.seen_at DESC) AS viewed_ids
+            FROM unnest(CAST(:user_ids AS INTEGER[]), CAST(:viewed_ids AS INTEGER[]), CAST(:seen_at AS DOUBLE PRECISION[]))
+                 AS v(user_id, viewed_id, seen_at)
+            JOIN users u ON u.id = v.user_id
+            GROUP BY v.user_id
+        )
+        INSERT INTO recently_viewed AS r (user_id, viewed_ids)
+        SELECT f.user_id, f.viewed_ids[1:CAST(:size AS INTEGER)]
+        FROM fresh f
+        ORDER BY f.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET viewed_ids = (
+                EXCLUDED.viewed_ids || ARRAY(
+                    SELECT old.viewed_id
+                    FROM unnest(r.viewed_ids) WITH ORDINALITY AS old(viewed_id, position)
+                    WHERE old.viewed_id <> ALL(EXCLUDED.viewed_ids)
+                    ORDER BY old.position
+                )
+            )[1:CAST(:size AS INTEGER)],
+            updated_at = LOCALTIMESTAMP;
+        """
+        try:
+            db.session.execute(query, {
+                'user_ids': user_ids,
+                'viewed_ids': viewed_ids,
+                'seen_at': seen_at,
+                'size': RECENTLY_VIEWED_SIZE,
+            })
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the views back behind any made since, unless the profile was viewed again in the meantime
+            with self._lock:
+                for user_id, views in pending.items():
+                    current = self._pending.setdefault(user_id, OrderedDict())
+                    for viewed_id, at in reversed(views.items()):
+                        if viewed_id not in current:
+                            current[viewed_id] = at
+                            current.move_to_end(viewed_id, last=False)
+                    while len(current) > RECENTLY_VIEWED_SIZE:
+                        current.popitem(last=False)
+            raise
+        return len(pending)
+
+    def _run(self):
+        while True:
+            time.sleep(HISTORY_FLUSH_INTERVAL)
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                print(f"[ERROR] Failed to write recently viewed profiles: {e}")
+
+    def _flush_on_exit(self):
+        if not self._pending or self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"[ERROR] Failed to write recently viewed profiles on shutdown: {e}")
+
+
+view_history = ViewHistory()
@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask_jwt_extended import JWTManager
+
+# Most verified tokens kept in memory; the least recently used one is dropped beyond this
+TOKEN_CACHE_SIZE = 10000
+
+
+class TokenCache:
+    """
+    Bounded LRU of access tokens whose signature and claims were already verified, mapped to their
+    decoded claims. An entry is only served until the token's `exp`; after that the token goes
+    through a full decode again, which rejects it (or accepts it within the configured leeway).
+    """
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._tokens = OrderedDict()  # (encoded token, csrf value) -> (expires at, claims)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the claims cached for `key`, or None on a miss or once the token expired."""
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.time():
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, claims):
+        with self._lock:
+            self._tokens[key] = (claims.get('exp'), claims)
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+
+class CachingJWTManager(JWTManager):
+    """
+    JWTManager that verifies each token once. Every @jwt_required() route and every decode_token()
+    call (socket connects included) decode through _decode_jwt_from_config, so caching its result
+    takes the signature check off every request made with a token already seen.
+    """
+
+    def __init__(self, app=None, add_context_processor=False):
+        self.token_cache = TokenCache()
+        super().__init__(app, add_context_processor)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = (encoded_token, csrf_value)
+        claims = self.token_cache.get(key)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+            self.token_cache.put(key, claims)
+        return claims
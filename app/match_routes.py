@@ -1,100 +1,137 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
+from app.utils import encode_cursor, decode_cursor, decode_time_cursor
+from app.deck import candidate_queue, fetch_deck_page, fetch_cards
+from app.recommendations import fetch_recommended_ids
+from app.card_cache import profile_cards
+from app.exclusions import exclusion_sets
+from app.blocks import block_list, add_block, remove_block, list_blocks
+from app.boosts import boost_queue, BOOST_DURATION_MINUTES, MAX_BOOST_DURATION_MINUTES
+from app.undo import recent_swipes, UNDO_DEPTH
+from app.stats import user_stats_counter, fetch_stats
+from app.history import view_history, RECENTLY_VIEWED_SIZE
 
 match_bp = Blueprint('match', __name__)
 
+# Upper bound on the number of swipes accepted by /match/swipes in one request
+MAX_SWIPE_BATCH = 100
+
+# Number of cards returned by /match/get_others per page, and the largest page a client may ask for
+DECK_PAGE_SIZE = 20
+MAX_DECK_PAGE_SIZE = 50
+
+# Page size of the likes and matches lists, and the largest page a client may ask for
+LIST_PAGE_SIZE = 20
+MAX_LIST_PAGE_SIZE = 100
+
 # Fetch other users for swiping
 @match_bp.route('/get_others', methods=['GET'])
 @jwt_required()
 def get_other_users():
     """
-    Fetch other users for swiping, excluding users the current user has already swiped right on
-    or users they have already matched with (using the matches table).
+    Fetch one page of other users for swiping, excluding users the current user has already swiped on
+    (using the swipes table) or users they have already matched with (using the matches table).
+    The first pages come from the user's ranked candidate queue; pass the returned next_cursor to
+    get the following page.
     """
     current_user_id = get_jwt_identity()
     collaboration_id = request.args.get('collaboration_id', type=int)  # Optional parameter
+    mode = request.args.get('mode')  # Optional: 'recommended' for collaborative filtering results
+    limit = min(request.args.get('limit', DECK_PAGE_SIZE, type=int), MAX_DECK_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+
+    if limit < 1:
+        return jsonify({'message': 'limit must be positive'}), 400
+
+    if mode not in (None, 'recommended'):
+        return jsonify({'message': 'Unknown mode'}), 400
+
+    # A cursor is either ['queue', served_ids] with the ids of the candidate queue already returned,
+    # [after_id] for the id ordered walk over the users the queue has not reached yet, or
+    # ['recommended', score, id]
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    if position is None:
+        position = ['recommended'] if mode == 'recommended' else ['queue', []]
+    elif not _valid_deck_position(position, mode):
+        return jsonify({'message': 'Invalid cursor'}), 400
 
     try:
         # Convert current_user_id to integer
         current_user_id = int(current_user_id)
 
-        if collaboration_id:
-            # Fetch users in the specified collaboration excluding swiped-right and matched users
-            query = """
-            SELECT u.id, u.username, u.bio, u.skills, u.location, u.profile_picture
-            FROM users u
-            JOIN user_collaborations uc ON u.id = uc.user_id
-            WHERE uc.collaboration_id = :collaboration_id
-              AND u.id != :current_user_id
-              AND u.id NOT IN (
-                  SELECT unnest(swipe_right) FROM users WHERE id = :current_user_id
-              )
-              AND u.id NOT IN (
-                  SELECT CASE
-                             WHEN user1_id = :current_user_id THEN user2_id
-                             ELSE user1_id
-                         END
-                  FROM matches
-                  WHERE :current_user_id IN (user1_id, user2_id)
-              );
-            """
-            params = {'collaboration_id': collaboration_id, 'current_user_id': current_user_id}
+        if mode == 'recommended':
+            # Served from the offline collaborative filtering results (see app/recommendations.py)
+            after = position[1:] if cursor else None
+            hidden = block_list.hidden(current_user_id)
+            recommended = fetch_recommended_ids(
+                current_user_id, collaboration_id, after, limit + 1, list(hidden) if hidden else None
+            )
+            other_users = fetch_cards([candidate_id for candidate_id, _ in recommended])
+            if len(recommended) > limit:
+                last_id, last_score = recommended[limit - 1]
+                next_position = ['recommended', last_score, last_id]
+            else:
+                next_position = None
+        elif position[0] == 'queue':
+            # Served from the precomputed, ranked candidate queue
+            served = set(position[1])
+            other_users = candidate_queue.peek(current_user_id, collaboration_id, limit + 1, served)
+            if len(other_users) > limit:
+                # Ids swiped off the deck since cannot come back, so they leave the cursor
+                still_queued = candidate_queue.queued(current_user_id, collaboration_id, position[1])
+                next_position = ['queue', still_queued + [user['id'] for user in other_users[:limit]]]
+            else:
+                # Queue used up: continue with an id ordered walk from the first user it has not
+                # put in yet, or over every user not swiped on once it went through them all
+                next_position = [candidate_queue.resume_id(current_user_id, collaboration_id)]
         else:
-            # Fetch all users excluding swiped-right and matched users
-            query = """
-            SELECT u.id, u.username, u.bio, u.skills, u.location, u.profile_picture
-            FROM users u
-            WHERE u.id != :current_user_id
-              AND u.id NOT IN (
-                  SELECT unnest(swipe_right) FROM users WHERE id = :current_user_id
-              )
-              AND u.id NOT IN (
-                  SELECT CASE
-                             WHEN user1_id = :current_user_id THEN user2_id
-                             ELSE user1_id
-                         END
-                  FROM matches
-                  WHERE :current_user_id IN (user1_id, user2_id)
-              );
-            """
-            params = {'current_user_id': current_user_id}
-
-        # Execute the query
-        other_users = db.session.execute(query, params).fetchall()
+            # Past the queue: read the page straight from the database, in id order
+            other_users = fetch_deck_page(current_user_id, collaboration_id, position[0], limit + 1)
+            next_position = [other_users[limit - 1]['id']] if len(other_users) > limit else None
 
         # Handle no users found
-        if not other_users:
+        if not other_users and not cursor:
             print(f"[DEBUG] No other users found for user ID {current_user_id}.")
             return jsonify({'message': 'No other users available'}), 404
 
-        # Prepare response data
-        users_data = [
-            {
-                'id': user[0],
-                'username': user[1],
-                'bio': user[2],
-                'skills': user[3],
-                'location': user[4],
-                'profile_picture': user[5],
-            }
-            for user in other_users
-        ]
+        users_data = other_users[:limit]
+        next_cursor = encode_cursor(next_position) if next_position else None
 
         print(f"[DEBUG] Retrieved {len(users_data)} other users for user ID {current_user_id}.")
-        return jsonify(users_data), 200
+        return jsonify({'users': users_data, 'next_cursor': next_cursor}), 200
 
     except Exception as e:
         print(f"[ERROR] Failed to fetch other users: {e}")
         return jsonify({'message': 'Failed to fetch other users'}), 500
 
+def _valid_deck_position(position, mode):
+    """Whether a decoded /match/get_others cursor has the shape of a position for `mode`."""
+    def is_id(value):
+        return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+    if not isinstance(position, list) or not position:
+        return False
+    if mode == 'recommended':
+        return (len(position) == 3 and position[0] == 'recommended'
+                and isinstance(position[1], (int, float)) and not isinstance(position[1], bool)
+                and is_id(position[2]))
+    if position[0] == 'queue':
+        return len(position) == 2 and isinstance(position[1], list) and all(is_id(value) for value in position[1])
+    return len(position) == 1 and is_id(position[0])
+
 # like (or "swipe right") a user
 @match_bp.route('/swipe_right/<int:target_user_id>', methods=['POST'])
 @jwt_required()
 def swipe_right(target_user_id):
     """
     Handle the logic for swiping right on a user.
-    Check for a mutual match and update the matches table if there's a match.
+    The swipe, the mutual match check and the matches insert happen atomically in the database.
+    A swipe is final: a user swiped left on stays swiped left, and only /match/undo_swipe (for
+    one of the last UNDO_DEPTH swipes) lets the current user swipe on them again.
     """
     current_user_id = get_jwt_identity()
 
@@ -102,96 +139,190 @@ def swipe_right(target_user_id):
         # Convert current_user_id to integer
         current_user_id = int(current_user_id)
 
-        # Fetch swipe_right list for the current user
-        current_user_query = "SELECT swipe_right FROM users WHERE id = :current_user_id;"
-        current_user = db.session.execute(current_user_query, {'current_user_id': current_user_id}).fetchone()
+        # Record the swipe and detect a mutual match in one atomic call (see migrations/002_record_swipe_right.sql)
+        swipe_query = "SELECT status, is_match FROM record_swipe_right(:current_user_id, :target_user_id);"
+        status, is_match = db.session.execute(swipe_query, {
+            'current_user_id': current_user_id,
+            'target_user_id': target_user_id,
+        }).fetchone()
 
-        # Ensure the current user exists
-        if not current_user:
-            return jsonify({'message': 'Current user not found'}), 404
+        if status == 'target_not_found':
+            db.session.rollback()
+            return jsonify({'message': 'Target user not found'}), 404
 
-        current_swipe_right = current_user[0] if current_user[0] else []
+        if status == 'already_swiped':
+            direction = db.session.execute(
+                "SELECT direction FROM swipes WHERE swiper_id = :current_user_id AND target_id = :target_user_id;",
+                {'current_user_id': current_user_id, 'target_user_id': target_user_id}
+            ).scalar()
+            db.session.rollback()
+            if direction == 'left':
+                return jsonify({'message': 'Already swiped left; undo that swipe to swipe right instead', 'direction': 'left'}), 400
+            return jsonify({'message': 'Already swiped right', 'direction': 'right'}), 400
+
+        # Keep the legacy array in sync while old instances may still read it
+        if current_app.config['SWIPE_ARRAY_DUAL_WRITE']:
+            db.session.execute(
+                "UPDATE users SET swipe_right = array_append(swipe_right, :target_user_id) WHERE id = :current_user_id;",
+                {'target_user_id': target_user_id, 'current_user_id': current_user_id}
+            )
 
-        # Ensure the target user exists
-        target_user_query = "SELECT swipe_right FROM users WHERE id = :target_user_id;"
-        target_user = db.session.execute(target_user_query, {'target_user_id': target_user_id}).fetchone()
+        db.session.commit()
 
-        if not target_user:
-            return jsonify({'message': 'Target user not found'}), 404
+        candidate_queue.pop(current_user_id, [target_user_id])
+        exclusion_sets.add(current_user_id, [target_user_id])
+        recent_swipes.record(current_user_id, [(target_user_id, 'right')])
+        user_stats_counter.record_swipes([(target_user_id, 'right')])
 
-        target_swipe_right = target_user[0] if target_user[0] else []
-        target_swipe_right = [int(user_id) for user_id in target_swipe_right]
+        if is_match:
+            candidate_queue.pop(target_user_id, [current_user_id])
+            exclusion_sets.add(target_user_id, [current_user_id])
+            print(f"[DEBUG] Match found: User {current_user_id} and User {target_user_id}")
+            return jsonify({'message': 'Swiped right successfully! It\'s a match!', 'is_match': True}), 200
 
-        # Debugging: Print types and values
-        print(f"[DEBUG] current_user_id: {current_user_id}, type: {type(current_user_id)}")
-        print(f"[DEBUG] target_swipe_right: {target_swipe_right}, type: {type(target_swipe_right)}")
-        print(f"[DEBUG] Current user swipe_right: {current_swipe_right}")
+        return jsonify({'message': 'Swiped right successfully', 'is_match': False}), 200
 
-        # Prevent duplicate swipes
-        if target_user_id in current_swipe_right:
-            return jsonify({'message': 'Already swiped right'}), 400
+    except Exception as e:
+        print(f"[ERROR] Failed to process swipe right for user {current_user_id} on user {target_user_id}: {e}")
+        return jsonify({'message': 'Failed to process swipe right'}), 500
 
-        # Add the target user to the current user's swipe_right list
-        current_swipe_right.append(target_user_id)
-        db.session.execute(
-            "UPDATE users SET swipe_right = :swipe_right WHERE id = :current_user_id;",
-            {'swipe_right': current_swipe_right, 'current_user_id': current_user_id}
-        )
 
-        # Check for mutual match
-        if current_user_id in target_swipe_right:
-            print('yes match')
-            # Add to the matches table
-            db.session.execute(
-                """
-                INSERT INTO matches (user1_id, user2_id, matched_at)
-                VALUES (:user1_id, :user2_id, NOW())
-                ON CONFLICT DO NOTHING;
-                """,
-                {'user1_id': min(current_user_id, target_user_id),
-                 'user2_id': max(current_user_id, target_user_id)}
-            )
+# apply a batch of queued left/right swipes
+@match_bp.route('/swipes', methods=['POST'])
+@jwt_required()
+def swipe_batch():
+    """
+    Apply a list of swipe decisions in one transaction.
+    Expects {"swipes": [{"target_id": 5, "direction": "right"}, ...]} and returns
+    the outcome of every swipe plus the users that became matches. A swipe on
+    yourself is not applied and comes back with the status 'cannot_swipe_self'.
+    """
+    current_user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    swipes = data.get('swipes')
 
-            print(f"[DEBUG] Match found: User {current_user_id} and User {target_user_id}")
-            db.session.commit()
+    if not isinstance(swipes, list) or not swipes:
+        return jsonify({'message': 'A non-empty list of swipes is required'}), 400
 
-            return jsonify({'message': 'Swiped right successfully! It\'s a match!', 'is_match': True}), 200
+    if len(swipes) > MAX_SWIPE_BATCH:
+        return jsonify({'message': f'At most {MAX_SWIPE_BATCH} swipes can be sent at once'}), 400
+
+    # The last decision for a target wins, and counts as made where it was in the list
+    decisions = {}
+    for swipe in swipes:
+        target_id = swipe.get('target_id') if isinstance(swipe, dict) else None
+        direction = swipe.get('direction') if isinstance(swipe, dict) else None
+        if not isinstance(target_id, int) or isinstance(target_id, bool) or direction not in ('left', 'right'):
+            return jsonify({'message': 'Each swipe needs an integer target_id and a direction of "left" or "right"'}), 400
+        decisions.pop(target_id, None)
+        decisions[target_id] = direction
+
+    # Convert current_user_id to integer
+    current_user_id = int(current_user_id)
+    swiped_self = decisions.pop(current_user_id, None) is not None
+
+    try:
+        # Apply every swipe and detect matches in one statement (see migrations/003_record_swipes.sql)
+        batch_query = """
+        SELECT target_id, status, is_match
+        FROM record_swipes(:current_user_id, CAST(:target_ids AS INTEGER[]), CAST(:directions AS TEXT[]));
+        """
+        results = db.session.execute(batch_query, {
+            'current_user_id': current_user_id,
+            'target_ids': list(decisions.keys()),
+            'directions': list(decisions.values()),
+        }).fetchall() if decisions else []
+
+        # Keep the legacy array in sync while old instances may still read it
+        new_right_swipes = [
+            result[0] for result in results
+            if result[1] == 'swiped' and decisions[result[0]] == 'right'
+        ]
+        if new_right_swipes and current_app.config['SWIPE_ARRAY_DUAL_WRITE']:
+            db.session.execute(
+                "UPDATE users SET swipe_right = swipe_right || CAST(:target_ids AS INTEGER[]) WHERE id = :current_user_id;",
+                {'target_ids': new_right_swipes, 'current_user_id': current_user_id}
+            )
 
-        # Commit the swipe action
         db.session.commit()
 
-        return jsonify({'message': 'Swiped right successfully', 'is_match': False}), 200
+        swiped_ids = [result[0] for result in results if result[1] == 'swiped']
+        candidate_queue.pop(current_user_id, swiped_ids)
+        exclusion_sets.add(current_user_id, swiped_ids)
+        swiped = set(swiped_ids)
+        new_swipes = [(target_id, direction) for target_id, direction in decisions.items() if target_id in swiped]
+        recent_swipes.record(current_user_id, new_swipes)
+        user_stats_counter.record_swipes(new_swipes)
+        for result in results:
+            if result[2]:
+                candidate_queue.pop(result[0], [current_user_id])
+                exclusion_sets.add(result[0], [current_user_id])
+
+        results_data = [
+            {'target_id': result[0], 'status': result[1], 'is_match': result[2]}
+            for result in results
+        ]
+        if swiped_self:
+            results_data.append({'target_id': current_user_id, 'status': 'cannot_swipe_self', 'is_match': False})
+            results_data.sort(key=lambda result: result['target_id'])
+        matches = [result[0] for result in results if result[2]]
+
+        print(f"[DEBUG] Applied {len(results_data)} swipes for user ID {current_user_id}, {len(matches)} new matches.")
+        return jsonify({'results': results_data, 'matches': matches}), 200
 
     except Exception as e:
-        print(f"[ERROR] Failed to process swipe right for user {current_user_id} on user {target_user_id}: {e}")
-        return jsonify({'message': 'Failed to process swipe right'}), 500
+        db.session.rollback()
+        print(f"[ERROR] Failed to apply swipe batch for user {current_user_id}: {e}")
+        return jsonify({'message': 'Failed to apply swipes'}), 500
 
 
 @match_bp.route('/matches', methods=['GET'])
 @jwt_required()
 def get_matches():
     """
-    Fetch all users who are mutual matches with the current user using the matches table.
+    Fetch the users who are mutual matches with the current user, newest match first.
+    Pass the returned next_cursor to get the following page.
     """
     current_user_id = get_jwt_identity()
+    limit = min(request.args.get('limit', LIST_PAGE_SIZE, type=int), MAX_LIST_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+
+    if limit < 1:
+        return jsonify({'message': 'limit must be positive'}), 400
+
+    try:
+        before_at, before_id = decode_time_cursor(cursor) if cursor else (None, None)
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
 
     try:
         # Convert current_user_id to integer
         current_user_id = int(current_user_id)
 
-        # Fetch mutual matches from the matches table
-        matches_query = """
-        SELECT u.id, u.username, u.bio, u.skills, u.location, u.profile_picture
-        FROM users u
-        JOIN matches m ON u.id = m.user2_id
-        WHERE m.user1_id = :current_user_id
-        UNION
-        SELECT u.id, u.username, u.bio, u.skills, u.location, u.profile_picture
-        FROM users u
-        JOIN matches m ON u.id = m.user1_id
-        WHERE m.user2_id = :current_user_id;
+        # Matches with blocked users stay in the table but are not listed
+        blocked = block_list.blocked(current_user_id)
+
+        # Read one page of the user's match edges (see migrations/006_match_edges.sql)
+        matches_query = f"""
+        SELECT u.id, u.username, u.bio, u.skills, u.location, u.profile_picture, e.matched_at
+        FROM match_edges e
+        JOIN users u ON u.id = e.other_id
+        WHERE e.user_id = :current_user_id
+          {"AND (e.matched_at, e.other_id) < (CAST(:before_at AS TIMESTAMP), :before_id)" if cursor else ""}
+          {"AND e.other_id <> ALL(:blocked_ids)" if blocked else ""}
+        ORDER BY e.matched_at DESC, e.other_id DESC
+        LIMIT :limit;
         """
-        matches = db.session.execute(matches_query, {'current_user_id': current_user_id}).fetchall()
+        matches = db.session.execute(matches_query, {
+            'current_user_id': current_user_id,
+            'before_at': before_at,
+            'before_id': before_id,
+            'blocked_ids': list(blocked) if blocked else None,
+            'limit': limit + 1,
+        }).fetchall()
+
+        has_more = len(matches) > limit
+        matches = matches[:limit]
 
         # Structure matched users' data
         matches_data = [
@@ -202,12 +333,14 @@ def get_matches():
                 'skills': user[3],
                 'location': user[4],
                 'profile_picture': user[5],
+                'matched_at': user[6].isoformat(),
             }
             for user in matches
         ]
+        next_cursor = encode_cursor([matches_data[-1]['matched_at'], matches_data[-1]['id']]) if has_more else None
 
         print(f"[DEBUG] Retrieved {len(matches_data)} matches for user ID {current_user_id}.")
-        return jsonify(matches_data), 200
+        return jsonify({'matches': matches_data, 'next_cursor': next_cursor}), 200
 
     except Exception as e:
         print(f"[ERROR] Failed to fetch matches for user ID {current_user_id}: {e}")
@@ -255,81 +388,65 @@ def get_user(user_id):
     """
     Fetch all necessary information about a specific user by their ID,
     including whether the current user has already swiped right on them.
+    The part of the card that is the same for every viewer is cached (see app/card_cache.py).
     """
     current_user_id = get_jwt_identity()  # The user making the request
 
-    try:
-        # Fetch user details
-        user_query = """
-        SELECT id, username, bio, skills, location, availability, profile_picture
-        FROM users
-        WHERE id = :user_id;
-        """
-        user = db.session.execute(user_query, {'user_id': user_id}).fetchone()
-
-        if not user:
-            print(f"[DEBUG] User with ID {user_id} not found.")
-            return jsonify({'message': 'User not found'}), 404
-
-        # Debug log for user details
-        print(f"[DEBUG] Retrieved user: ID={user[0]}, Username={user[1]}, Profile Picture={user[6]}")
-
-        # Check if the current user has already swiped right on the target user
-        swipe_check_query = """
-        SELECT :user_id = ANY(swipe_right)
-        FROM users
-        WHERE id = :current_user_id;
-        """
-        already_swiped = db.session.execute(swipe_check_query, {
-            'user_id': user_id,
-            'current_user_id': current_user_id,
-        }).scalar()
+    # Check if the current user has already swiped right on the target user
+    swipe_check = """
+    EXISTS (
+        SELECT 1 FROM swipes
+        WHERE swiper_id = :current_user_id AND target_id = :user_id AND direction = 'right'
+    )
+    """
+    params = {'user_id': user_id, 'current_user_id': current_user_id}
 
-        # Fetch collaborations where the user is a member or admin
-        collaborations_query = """
-        SELECT c.id, c.name, c.description
-        FROM collaborations c
-        JOIN user_collaborations uc ON c.id = uc.collaboration_id
-        WHERE uc.user_id = :user_id;
-        """
-        collaborations = db.session.execute(collaborations_query, {'user_id': user_id}).fetchall()
+    try:
+        card = profile_cards.get(user_id)
+        if card is not None:
+            already_swiped = db.session.execute(f"SELECT {swipe_check};", params).scalar()
+        else:
+            generation = profile_cards.generation()
+            # Build the whole card, collaborations and collections included, in one round trip
+            card_query = f"""
+            SELECT json_build_object(
+                'id', u.id,
+                'username', u.username,
+                'bio', u.bio,
+                'skills', u.skills,
+                'location', u.location,
+                'availability', u.availability,
+                'profile_picture', u.profile_picture,
+                'collaborations', COALESCE((
+                    SELECT json_agg(json_build_object('id', c.id, 'name', c.name, 'description', c.description) ORDER BY c.id)
+                    FROM collaborations c
+                    JOIN user_collaborations uc ON c.id = uc.collaboration_id
+                    WHERE uc.user_id = u.id
+                ), '[]'::json),
+                'collections', COALESCE((
+                    SELECT json_agg(json_build_object('id', cl.id, 'name', cl.name) ORDER BY cl.id)
+                    FROM collections cl
+                    WHERE cl.user_id = u.id
+                ), '[]'::json)
+            ) AS card,
+            {swipe_check} AS already_swiped
+            FROM users u
+            WHERE u.id = :user_id;
+            """
+            row = db.session.execute(card_query, params).fetchone()
 
-        # Structure collaborations data
-        collaborations_data = [
-            {'id': collab[0], 'name': collab[1], 'description': collab[2]}
-            for collab in collaborations
-        ]
+            if not row:
+                print(f"[DEBUG] User with ID {user_id} not found.")
+                return jsonify({'message': 'User not found'}), 404
 
-        # Fetch collections for the user (if applicable)
-        collections_query = """
-        SELECT id, name
-        FROM collections
-        WHERE user_id = :user_id;
-        """
-        collections = db.session.execute(collections_query, {'user_id': user_id}).fetchall()
+            card, already_swiped = row[0], row[1]
+            profile_cards.put(user_id, card, generation)
 
-        # Structure collections data
-        collections_data = [
-            {'id': collection[0], 'name': collection[1]}
-            for collection in collections
-        ]
+        user_stats_counter.record_view(int(current_user_id), user_id)
+        view_history.record(int(current_user_id), user_id)
 
-        # Combine all user data
-        user_data = {
-            'id': user[0],
-            'username': user[1],
-            'bio': user[2],
-            'skills': user[3],
-            'location': user[4],
-            'availability': user[5],
-            'profile_picture': user[6],
-            'collaborations': collaborations_data,
-            'collections': collections_data,
-            'already_swiped_right': already_swiped,  # Add swipe right status
-        }
-
-        print("[DEBUG] Final user data response:")
-        print(user_data)
+        user_data = dict(card, already_swiped_right=already_swiped)
+        print(f"[DEBUG] Retrieved user card: ID={user_data['id']}, Username={user_data['username']}")
 
         return jsonify(user_data), 200
 
@@ -343,32 +460,59 @@ def get_user(user_id):
 @jwt_required()
 def likes():
     """
-    Get all users who swiped right on the logged-in user, excluding users they have already matched with.
+    Get the users who swiped right on the logged-in user, excluding users they have already matched with.
+    Newest likes come first; pass the returned next_cursor to get the following page.
     """
     current_user_id = get_jwt_identity()  # The ID of the logged-in user
+    limit = min(request.args.get('limit', LIST_PAGE_SIZE, type=int), MAX_LIST_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+
+    if limit < 1:
+        return jsonify({'message': 'limit must be positive'}), 400
 
     try:
-        # Fetch users who liked the current user but are not mutual matches
-        query = """
-        SELECT id, username, bio, skills, location, profile_picture
-        FROM users
-        WHERE :current_user_id = ANY(swipe_right)
-          AND id NOT IN (
-              SELECT CASE
-                         WHEN user1_id = :current_user_id THEN user2_id
-                         ELSE user1_id
-                     END
-              FROM matches
-              WHERE :current_user_id IN (user1_id, user2_id)
-          );
+        before_at, before_id = decode_time_cursor(cursor) if cursor else (None, None)
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    try:
+        # Likes from blocked or muted users are not listed nor counted
+        hidden = block_list.hidden(int(current_user_id))
+        hidden_filter = "AND l.liker_id <> ALL(:hidden_ids)" if hidden else ""
+
+        # Read one page of the inbound likes index (see migrations/005_inbound_likes.sql)
+        query = f"""
+        SELECT u.id, u.username, u.bio, u.skills, u.location, u.profile_picture, l.liked_at
+        FROM inbound_likes l
+        JOIN users u ON u.id = l.liker_id
+        WHERE l.target_id = :current_user_id
+          {"AND (l.liked_at, l.liker_id) < (CAST(:before_at AS TIMESTAMP), :before_id)" if cursor else ""}
+          {hidden_filter}
+        ORDER BY l.liked_at DESC, l.liker_id DESC
+        LIMIT :limit;
         """
-        liked_users = db.session.execute(query, {'current_user_id': current_user_id}).fetchall()
+        liked_users = db.session.execute(query, {
+            'current_user_id': current_user_id,
+            'before_at': before_at,
+            'before_id': before_id,
+            'hidden_ids': list(hidden) if hidden else None,
+            'limit': limit + 1,
+        }).fetchall()
 
         # Handle case where no users are found
-        if not liked_users:
+        if not liked_users and not cursor:
             print(f"[DEBUG] No users found who liked user ID {current_user_id}.")
             return jsonify({'message': 'No users have liked you yet.'}), 404
 
+        total_query = f"SELECT COUNT(*) FROM inbound_likes l WHERE l.target_id = :current_user_id {hidden_filter};"
+        total = db.session.execute(total_query, {
+            'current_user_id': current_user_id,
+            'hidden_ids': list(hidden) if hidden else None,
+        }).scalar()
+
+        has_more = len(liked_users) > limit
+        liked_users = liked_users[:limit]
+
         # Structure liked users' data
         liked_users_data = [
             {
@@ -378,30 +522,34 @@ def likes():
                 'skills': user[3],
                 'location': user[4],
                 'profile_picture': user[5],
+                'liked_at': user[6].isoformat(),
             }
             for user in liked_users
         ]
+        next_cursor = encode_cursor([liked_users_data[-1]['liked_at'], liked_users_data[-1]['id']]) if has_more else None
 
-        print(f"[DEBUG] Retrieved {len(liked_users_data)} users who liked user ID {current_user_id}.")
-        return jsonify(liked_users_data), 200
+        print(f"[DEBUG] Retrieved {len(liked_users_data)} of {total} users who liked user ID {current_user_id}.")
+        return jsonify({'users': liked_users_data, 'total': total, 'next_cursor': next_cursor}), 200
 
     except Exception as e:
         print(f"[ERROR] Failed to fetch users who liked user ID {current_user_id}: {e}")
         return jsonify({'message': 'Failed to fetch users who liked you.'}), 500
+
 @match_bp.route('/block_user/<int:user_id>', methods=['POST'])
 @jwt_required()
 def block_user(user_id):
-    return jsonify({'message': 'User blocked.'}), 200
+    """Block a user: the two users no longer see each other anywhere and cannot message each other."""
+    return add_block(user_id, 'block')
 
 @match_bp.route('/unblock_user/<int:user_id>', methods=['POST'])
 @jwt_required()
 def unblock_user(user_id):
-    return jsonify({'message': 'User unblocked.'}), 200
+    return remove_block(user_id, 'block')
 
 @match_bp.route('/blocked_users', methods=['GET'])
 @jwt_required()
 def get_blocked_users():
-    return jsonify({'blocked_users': []}), 200
+    return list_blocks('block')
 
 @match_bp.route('/report_user/<int:user_id>', methods=['POST'])
 @jwt_required()
@@ -416,12 +564,77 @@ def super_like_user(user_id):
 @match_bp.route('/undo_swipe/<int:user_id>', methods=['POST'])
 @jwt_required()
 def undo_swipe(user_id):
-    return jsonify({'message': 'Swipe undone.'}), 200
+    """
+    Undo the current user's swipe on `user_id`, which must be one of their last UNDO_DEPTH swipes.
+    The swipe and the match it created (if any) are deleted in one transaction, and the user's
+    card goes back to the head of the deck.
+    """
+    current_user_id = int(get_jwt_identity())
+
+    try:
+        if recent_swipes.find(current_user_id, user_id) is None:
+            db.session.rollback()
+            return jsonify({'message': f'Only your last {UNDO_DEPTH} swipes can be undone.'}), 404
+
+        # Delete the swipe and its match under the pair lock (see migrations/011_undo_swipe.sql)
+        undo_query = "SELECT status, swipe_direction, was_match FROM undo_swipe(:current_user_id, :user_id, :depth);"
+        status, direction, was_match = db.session.execute(undo_query, {
+            'current_user_id': current_user_id,
+            'user_id': user_id,
+            'depth': UNDO_DEPTH,
+        }).fetchone()
+
+        if status == 'not_recent':
+            db.session.rollback()
+            recent_swipes.discard(current_user_id, user_id)
+            return jsonify({'message': f'Only your last {UNDO_DEPTH} swipes can be undone.'}), 404
+
+        # Keep the legacy array in sync while old instances may still read it
+        if direction == 'right' and current_app.config['SWIPE_ARRAY_DUAL_WRITE']:
+            db.session.execute(
+                "UPDATE users SET swipe_right = array_remove(swipe_right, :user_id) WHERE id = :current_user_id;",
+                {'user_id': user_id, 'current_user_id': current_user_id}
+            )
+
+        db.session.commit()
+
+        recent_swipes.discard(current_user_id, user_id)
+        exclusion_sets.remove(current_user_id, [user_id])
+        cards = fetch_cards([user_id])
+        if cards:
+            candidate_queue.restore(current_user_id, cards[0])
+
+        print(f"[DEBUG] User {current_user_id} undid their {direction} swipe on user {user_id} (match removed: {was_match}).")
+        return jsonify({'message': 'Swipe undone.', 'direction': direction, 'match_removed': was_match}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to undo swipe of user {current_user_id} on user {user_id}: {e}")
+        return jsonify({'message': 'Failed to undo swipe.'}), 500
 
 @match_bp.route('/recently_viewed', methods=['GET'])
 @jwt_required()
 def recently_viewed():
-    return jsonify({'recently_viewed': []}), 200
+    """
+    Return the cards of the profiles the current user opened most recently, newest first.
+    Up to `limit` (optional) cards are returned, from the last RECENTLY_VIEWED_SIZE profiles viewed.
+    """
+    current_user_id = int(get_jwt_identity())
+    limit = request.args.get('limit', default=LIST_PAGE_SIZE, type=int)
+    if limit < 1:
+        return jsonify({'message': 'limit must be positive'}), 400
+    limit = min(limit, RECENTLY_VIEWED_SIZE)
+
+    try:
+        viewed_ids = view_history.recent_ids(current_user_id, RECENTLY_VIEWED_SIZE)
+        blocked = block_list.blocked(current_user_id)
+        if blocked is not None:
+            viewed_ids = [viewed_id for viewed_id in viewed_ids if viewed_id not in blocked]
+        cards = fetch_cards(viewed_ids[:limit])
+        return jsonify({'recently_viewed': cards}), 200
+    except Exception as e:
+        print(f"[ERROR] Failed to fetch recently viewed profiles for user ID {current_user_id}: {e}")
+        return jsonify({'message': 'Failed to fetch recently viewed profiles.'}), 500
 
 @match_bp.route('/favorite_user/<int:user_id>', methods=['POST'])
 @jwt_required()
@@ -491,17 +704,18 @@ def match_history():
 @match_bp.route('/mute_user/<int:user_id>', methods=['POST'])
 @jwt_required()
 def mute_user(user_id):
-    return jsonify({'message': 'User muted.'}), 200
+    """Mute a user: they leave your deck and likes and their messages are no longer pushed to you."""
+    return add_block(user_id, 'mute')
 
 @match_bp.route('/unmute_user/<int:user_id>', methods=['POST'])
 @jwt_required()
 def unmute_user(user_id):
-    return jsonify({'message': 'User unmuted.'}), 200
+    return remove_block(user_id, 'mute')
 
 @match_bp.route('/muted_users', methods=['GET'])
 @jwt_required()
 def get_muted_users():
-    return jsonify({'muted_users': []}), 200
+    return list_blocks('mute')
 
 @match_bp.route('/hide_match/<int:match_id>', methods=['POST'])
 @jwt_required()
@@ -536,12 +750,77 @@ def sent_gifts():
 @match_bp.route('/boost_profile', methods=['POST'])
 @jwt_required()
 def boost_profile():
-    return jsonify({'message': 'Profile boosted.'}), 200
+    """
+    Boost the current user's profile for `duration_minutes` (optional): their card goes ahead of the
+    ranked candidates in other users' decks, with a priority that decays while the boost runs.
+    Only one boost can be active at a time.
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    duration = data.get('duration_minutes', BOOST_DURATION_MINUTES)
+
+    if isinstance(duration, bool) or not isinstance(duration, int) or not 1 <= duration <= MAX_BOOST_DURATION_MINUTES:
+        return jsonify({'message': f'duration_minutes must be between 1 and {MAX_BOOST_DURATION_MINUTES}'}), 400
+
+    try:
+        # Serializes the boosts of one user, so two concurrent requests cannot both pass the check
+        # below (single key advisory locks do not collide with the two key swipe pair locks)
+        db.session.execute("SELECT pg_advisory_xact_lock(:current_user_id);", {'current_user_id': current_user_id})
+        boost_query = """
+        INSERT INTO profile_boosts (user_id, expires_at)
+        SELECT :current_user_id, LOCALTIMESTAMP + make_interval(mins => :duration)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM profile_boosts
+            WHERE user_id = :current_user_id AND expires_at > LOCALTIMESTAMP
+        )
+        RETURNING id, weight, started_at, expires_at;
+        """
+        boost = db.session.execute(boost_query, {'current_user_id': current_user_id, 'duration': duration}).fetchone()
+        db.session.commit()
+
+        if not boost:
+            return jsonify({'message': 'Profile is already boosted.'}), 409
+
+        cards = fetch_cards([current_user_id])
+        if cards:
+            boost_queue.add(boost[0], current_user_id, boost[1], boost[2].timestamp(), boost[3].timestamp(), cards[0])
+
+        print(f"[DEBUG] User {current_user_id} boosted their profile for {duration} minutes.")
+        return jsonify({
+            'message': 'Profile boosted.',
+            'boost': {'id': boost[0], 'started_at': boost[2].isoformat(), 'expires_at': boost[3].isoformat()},
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to boost profile of user ID {current_user_id}: {e}")
+        return jsonify({'message': 'Failed to boost profile.'}), 500
 
 @match_bp.route('/profile_boosts', methods=['GET'])
 @jwt_required()
 def profile_boosts():
-    return jsonify({'boosts': []}), 200
+    """List the current user's boosts, newest first."""
+    current_user_id = int(get_jwt_identity())
+    try:
+        boosts_query = """
+        SELECT id, started_at, expires_at, expires_at > LOCALTIMESTAMP
+        FROM profile_boosts
+        WHERE user_id = :current_user_id
+        ORDER BY started_at DESC
+        LIMIT :limit;
+        """
+        boosts = db.session.execute(boosts_query, {
+            'current_user_id': current_user_id,
+            'limit': MAX_LIST_PAGE_SIZE,
+        }).fetchall()
+        boosts_data = [
+            {'id': boost[0], 'started_at': boost[1].isoformat(), 'expires_at': boost[2].isoformat(), 'active': boost[3]}
+            for boost in boosts
+        ]
+        return jsonify({'boosts': boosts_data}), 200
+    except Exception as e:
+        print(f"[ERROR] Failed to fetch boosts of user ID {current_user_id}: {e}")
+        return jsonify({'message': 'Failed to fetch profile boosts.'}), 500
 
 @match_bp.route('/send_message/<int:match_id>', methods=['POST'])
 @jwt_required()
@@ -576,12 +855,23 @@ def get_pinned_matches():
 @match_bp.route('/match_statistics', methods=['GET'])
 @jwt_required()
 def match_statistics():
-    return jsonify({'statistics': {}}), 200
+    """Swipes given and received, matches, match rate and profile views of the current user (see app/stats.py)."""
+    current_user_id = int(get_jwt_identity())
+    try:
+        return jsonify({'statistics': fetch_stats(current_user_id)}), 200
+    except Exception as e:
+        print(f"[ERROR] Failed to fetch match statistics for user ID {current_user_id}: {e}")
+        return jsonify({'message': 'Failed to fetch match statistics.'}), 500
 
 @match_bp.route('/profile_views', methods=['GET'])
 @jwt_required()
 def profile_views():
-    return jsonify({'views': 0}), 200
+    current_user_id = int(get_jwt_identity())
+    try:
+        return jsonify({'views': fetch_stats(current_user_id)['profile_views']}), 200
+    except Exception as e:
+        print(f"[ERROR] Failed to fetch profile views for user ID {current_user_id}: {e}")
+        return jsonify({'message': 'Failed to fetch profile views.'}), 500
 
 @match_bp.route('/match_reminders', methods=['GET'])
 @jwt_required()
@@ -0,0 +1,201 @@
+import threading
+import time
+
+from app import socketio
+from app.activity import activity_tracker
+from app.utils import inbox_room, conversation_id
+
+# Seconds a connection counts as present after it connected or last sent a heartbeat
+PRESENCE_TTL = 60
+
+# Seconds between two turns of the expiry wheel; expiry happens up to this much after PRESENCE_TTL
+WHEEL_TICK = 5
+
+# Shortest time between two typing notifications forwarded for the same sender and receiver
+TYPING_INTERVAL = 2
+
+# Seconds without a typing notification after which the sender is taken to have stopped typing
+TYPING_IDLE = 5 * TYPING_INTERVAL
+
+# Most users one connection can follow the presence of
+MAX_WATCHED_USERS = 200
+
+
+def presence_room(user_id):
+    """Room of the connections following the presence of `user_id`."""
+    return f"presence:{user_id}"
+
+
+class _Typing:
+    """Typing state of one sender towards one receiver."""
+
+    __slots__ = ('forwarded_at', 'seen_at')
+
+    def __init__(self):
+        self.forwarded_at = 0  # when a start was last forwarded to the receiver
+        self.seen_at = 0  # when the sender last said they are typing
+
+
+class PresenceRegistry:
+    """
+    Which users have a live socket connection to this process. A connection is present from its
+    connect until its disconnect, or until PRESENCE_TTL seconds pass without a heartbeat (a client
+    in the background keeps its socket but stops sending them). A user is online while at least
+    one of their connections is present; the online / offline transitions are emitted to
+    presence_room(user_id).
+
+    Expiry runs on a timer wheel: one slot per WHEEL_TICK seconds, each holding the connections
+    whose TTL ends during it. A heartbeat moves its connection to the slot PRESENCE_TTL ahead,
+    and one background thread empties a slot per tick, so the cost of expiry depends on how many
+    connections actually expire, not on how many are connected, and there is no timer per user.
+    The same turn of the wheel sends the stop of senders who went TYPING_IDLE seconds without a
+    typing notification.
+
+    Each worker only knows its own connections. When emits go through a message queue (several
+    workers), presence events carry exact=False: online is reliable, offline only means the user
+    has no connection left on the worker that sent it.
+
+    Presence and typing never hit the database. Connects, heartbeats and disconnects mark the user
+    active through activity_tracker, which writes users.last_active in batches.
+    """
+
+    def __init__(self, app=None):
+        self.exact = True  # whether this process sees every connection
+        self._lock = threading.Lock()
+        self._ttl_ticks = -(-PRESENCE_TTL // WHEEL_TICK)
+        self._slots = [set() for _ in range(self._ttl_ticks + 1)]
+        self._tick = 0  # slot emptied by the last turn of the wheel
+        self._connections = {}  # sid -> (user id, slot it expires in)
+        self._users = {}  # user id -> sids present
+        self._typing = {}  # (sender id, receiver id) -> _Typing, while the sender is typing
+        self._worker_started = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.exact = not app.config.get('SOCKETIO_MESSAGE_QUEUE')
+
+    def connect(self, user_id, sid):
+        """Register a new connection of `user_id`."""
+        self._keep(user_id, sid)
+
+    def heartbeat(self, user_id, sid):
+        """Extend the presence of a connection by PRESENCE_TTL seconds."""
+        self._keep(user_id, sid)
+
+    def disconnect(self, sid):
+        with self._lock:
+            entry = self._connections.pop(sid, None)
+            if entry is None:
+                return
+            self._slots[entry[1]].discard(sid)
+            went_offline = self._remove(entry[0], sid)
+        activity_tracker.touch(entry[0])
+        if went_offline:
+            self._emit(entry[0], False)
+
+    def is_online(self, user_id):
+        with self._lock:
+            return user_id in self._users
+
+    def online(self, user_ids):
+        """The users among `user_ids` that are online."""
+        with self._lock:
+            return {user_id for user_id in user_ids if user_id in self._users}
+
+    def typing(self, sender_id, receiver_id, typing):
+        """
+        Tell `receiver_id` that `sender_id` started or stopped typing to them. A start is forwarded
+        at most once every TYPING_INTERVAL seconds, a stop only if a start was forwarded before.
+        """
+        now = time.time()
+        key = (sender_id, receiver_id)
+        with self._lock:
+            if not typing:
+                if self._typing.pop(key, None) is None:
+                    return
+            else:
+                state = self._typing.get(key)
+                if state is None:
+                    state = self._typing[key] = _Typing()
+                state.seen_at = now
+                if now - state.forwarded_at < TYPING_INTERVAL:
+                    return
+                state.forwarded_at = now
+        self._emit_typing(sender_id, receiver_id, typing)
+
+    def _keep(self, user_id, sid):
+        with self._lock:
+            slot = (self._tick + self._ttl_ticks) % len(self._slots)
+            entry = self._connections.get(sid)
+            if entry is not None:
+                self._slots[entry[1]].discard(sid)
+            self._connections[sid] = (user_id, slot)
+            self._slots[slot].add(sid)
+            sids = self._users.setdefault(user_id, set())
+            came_online = not sids
+            sids.add(sid)
+            self._start_worker()
+        activity_tracker.touch(user_id)
+        if came_online:
+            self._emit(user_id, True)
+
+    def _start_worker(self):
+        if not self._worker_started:
+            self._worker_started = True
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _remove(self, user_id, sid):
+        """Drop `sid` from its user's connections; returns whether that was their last one."""
+        sids = self._users.get(user_id)
+        if sids is None:
+            return False
+        sids.discard(sid)
+        if sids:
+            return False
+        del self._users[user_id]
+        return True
+
+    def _turn(self):
+        """Advance the wheel by one slot, expire the connections in it and end idle typing."""
+        went_offline = []
+        with self._lock:
+            self._tick = (self._tick + 1) % len(self._slots)
+            expired, self._slots[self._tick] = self._slots[self._tick], set()
+            for sid in expired:
+                user_id = self._connections.pop(sid)[0]
+                if self._remove(user_id, sid):
+                    went_offline.append(user_id)
+            cutoff = time.time() - TYPING_IDLE
+            stopped = [key for key, state in self._typing.items() if state.seen_at < cutoff]
+            for key in stopped:
+                del self._typing[key]
+        for user_id in went_offline:
+            self._emit(user_id, False)
+        for sender_id, receiver_id in stopped:
+            self._emit_typing(sender_id, receiver_id, False)
+        return len(expired)
+
+    def _emit(self, user_id, online):
+        socketio.emit('presence', {'user_id': user_id, 'online': online, 'exact': self.exact},
+                      to=presence_room(user_id))
+
+    def _emit_typing(self, sender_id, receiver_id, typing):
+        socketio.emit('typing', {
+            'conversation_id': conversation_id(sender_id, receiver_id),
+            'sender_id': sender_id,
+            'typing': typing,
+        }, to=inbox_room(receiver_id))
+
+    def _run(self):
+        while True:
+            time.sleep(WHEEL_TICK)
+            try:
+                expired = self._turn()
+                if expired:
+                    print(f"[DEBUG] Expired {expired} socket connections without a heartbeat.")
+            except Exception as e:
+                print(f"[ERROR] Failed to expire socket presence: {e}")
+
+
+presence = PresenceRegistry()
@@ -8,6 +8,11 @@ import os
 from botocore.exceptions import NoCredentialsError
 from botocore.config import Config as BotoConfig
 from app.config import Config
+from app.ranking import skill_index
+from app.activity import ACTIVE_POOL_DAYS
+from app.card_cache import profile_cards
+from app.blocks import block_list, add_block, remove_block, list_blocks
+from app.stats import fetch_stats
 
 profile_bp = Blueprint('profile', __name__)
 
@@ -159,10 +164,11 @@ def update_profile():
         location = COALESCE(:location, location),
         availability = COALESCE(:availability, availability),
         profile_picture = COALESCE(:profile_picture, profile_picture)
-    WHERE id = :user_id;
+    WHERE id = :user_id
+    RETURNING skills, preferred_medium;
     """
     try:
-        db.session.execute(
+        updated = db.session.execute(
             update_query,
             {
                 'bio': bio,
@@ -172,8 +178,17 @@ def update_profile():
                 'profile_picture': profile_picture_path,
                 'user_id': user_id,
             },
-        )
+        ).fetchone()
+        if updated is None:
+            # Deleted since the check above
+            db.session.rollback()
+            return jsonify({'message': 'User not found'}), 404
         db.session.commit()
+
+        # Keep the deck ranking vectors and the cached profile card in step with the new profile
+        skill_index.update_user(int(user_id), updated[0], updated[1])
+        profile_cards.invalidate(user_id)
+
         return jsonify({'message': 'Profile updated successfully', 'profile_picture_url': profile_picture_path}), 200
     except Exception as db_error:
         return jsonify({'message': 'Failed to update profile', 'error': str(db_error)}), 500
@@ -185,7 +200,8 @@ def update_profile():
 @jwt_required()
 def get_other_users():
     """
-    Fetch all other users except the current user, optionally filtered by collaboration ID.
+    Fetch the other users active in the last ACTIVE_POOL_DAYS days, or all other members of a
+    collaboration when a collaboration ID is given.
     """
     current_user_id = get_jwt_identity()
     collaboration_id = request.args.get('collaboration_id', type=int)  # Optional filter
@@ -201,16 +217,22 @@ def get_other_users():
             """
             params = {'collaboration_id': collaboration_id, 'current_user_id': current_user_id}
         else:
-            # Fetch all other users except the current user
+            # Fetch the other users of the active pool (see app/activity.py)
             query = """
             SELECT id, username, bio, skills, location, profile_picture
             FROM users
-            WHERE id != :current_user_id;
+            WHERE last_active >= LOCALTIMESTAMP - make_interval(days => :active_days)
+              AND id != :current_user_id;
             """
-            params = {'current_user_id': current_user_id}
+            params = {'current_user_id': current_user_id, 'active_days': ACTIVE_POOL_DAYS}
 
         other_users = db.session.execute(query, params).fetchall()
 
+        # Leave out users blocked or muted either way
+        hidden = block_list.hidden(int(current_user_id))
+        if hidden is not None:
+            other_users = [user for user in other_users if user[0] not in hidden]
+
         if not other_users:
             print(f"[DEBUG] No other users found for user ID {current_user_id}.")
             return jsonify({'message': 'No other users available'}), 404
@@ -258,6 +280,7 @@ def create_collection():
         """
         result = db.session.execute(query, {'user_id': user_id, 'name': collection_name})
         db.session.commit()
+        profile_cards.invalidate(user_id)
 
         # Get the ID of the newly created collection
         collection_id = result.fetchone()[0]
@@ -366,9 +389,11 @@ def get_collection_items(collection_id):
 def delete_collection(collection_id):
     print(f"[DEBUG] Deleting collection_id: {collection_id}")
 
-    query = "DELETE FROM collections WHERE id = :collection_id"
-    db.session.execute(query, {'collection_id': collection_id})
+    query = "DELETE FROM collections WHERE id = :collection_id RETURNING user_id"
+    deleted = db.session.execute(query, {'collection_id': collection_id}).fetchone()
     db.session.commit()
+    if deleted:
+        profile_cards.invalidate(deleted[0])
 
     print(f"[DEBUG] Collection deleted: {collection_id}")
     return jsonify({'message': 'Collection deleted successfully'}), 200
@@ -406,7 +431,7 @@ def get_collections_by_user(user_id):
     except Exception as e:
         print(f"[ERROR] {e}")
         return jsonify({'error': 'Failed to fetch collections for the user.'}), 500
-    @profile_bp.route('/verify', methods=['POST'])
+@profile_bp.route('/verify', methods=['POST'])
 @jwt_required()
 def verify_profile():
     return jsonify({'message': 'Profile verification requested.'}), 200
@@ -469,22 +494,28 @@ def get_status():
 @profile_bp.route('/profile_views', methods=['GET'])
 @jwt_required()
 def get_profile_views():
-    return jsonify({'views': 0}), 200
+    current_user_id = int(get_jwt_identity())
+    try:
+        return jsonify({'views': fetch_stats(current_user_id)['profile_views']}), 200
+    except Exception as e:
+        print(f"[ERROR] Failed to fetch profile views for user ID {current_user_id}: {e}")
+        return jsonify({'message': 'Failed to fetch profile views.'}), 500
 
 @profile_bp.route('/block_user/<int:user_id>', methods=['POST'])
 @jwt_required()
 def block_user(user_id):
-    return jsonify({'message': 'User blocked.'}), 200
+    """Block a user: the two users no longer see each other anywhere and cannot message each other."""
+    return add_block(user_id, 'block')
 
 @profile_bp.route('/unblock_user/<int:user_id>', methods=['POST'])
 @jwt_required()
 def unblock_user(user_id):
-    return jsonify({'message': 'User unblocked.'}), 200
+    return remove_block(user_id, 'block')
 
 @profile_bp.route('/blocked_users', methods=['GET'])
 @jwt_required()
 def blocked_users():
-    return jsonify({'blocked_users': []}), 200
+    return list_blocks('block')
 
 @profile_bp.route('/profile_theme', methods=['PUT'])
 @jwt_required()
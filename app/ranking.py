@@ -0,0 +1,172 @@
+import threading
+import time
+
+import numpy as np
+
+from app import db
+
+# Weight of the recency boost relative to the skill overlap score (which is between 0 and 1)
+RECENCY_WEIGHT = 0.25
+
+# Days after which the recency boost of a user has decayed to 1/e
+RECENCY_DECAY_DAYS = 7.0
+
+# Rows read per round trip when loading the index
+LOAD_CHUNK_SIZE = 5000
+
+
+def _timestamp(value):
+    """Convert a nullable datetime column to epoch seconds, NaN when unknown."""
+    return value.timestamp() if value else np.nan
+
+
+class SkillIndex:
+    """
+    In-memory bit vectors of every user's skills and preferred media, encoded against one shared
+    vocabulary, so a whole candidate pool can be scored with a few vectorized NumPy operations.
+    Vectors are loaded once and then updated one user at a time as profiles change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # held while the first load runs
+        self._loaded = False
+        self._vocabulary = {}
+        self._rows = {}  # user id -> row in the arrays below
+        self._row_of = np.full(0, -1, dtype=np.int64)  # the same mapping as a dense array indexed by user id
+        self._bits = np.zeros((0, 1), dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.int32)
+        self._last_active = np.zeros(0, dtype=np.float64)  # epoch seconds, NaN if unknown
+
+    def rank(self, user_id, candidate_ids, k):
+        """
+        Return the `k` best candidates for `user_id` as a list of ids, best first. The score is the
+        Jaccard overlap of skills and preferred media plus a boost for recently active users.
+        """
+        if not candidate_ids or k < 1:
+            return []
+        self._ensure_loaded()
+        ids = np.asarray(candidate_ids, dtype=np.int64)
+        self._ensure_users(np.append(ids, user_id))
+
+        with self._lock:
+            me = self._rows[user_id]
+            rows = self._row_of[ids]
+            overlap = np.bitwise_count(self._bits[rows] & self._bits[me]).sum(axis=1, dtype=np.int32)
+            union = self._counts[rows] + self._counts[me] - overlap
+            last_active = self._last_active[rows]
+
+        jaccard = np.divide(overlap, union, out=np.zeros(len(rows)), where=union > 0)
+        age_days = (time.time() - last_active) / 86400.0
+        recency = np.nan_to_num(np.exp(-np.clip(age_days, 0, None) / RECENCY_DECAY_DAYS))
+        scores = jaccard + RECENCY_WEIGHT * recency
+
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [candidate_ids[i] for i in top]
+
+    def update_user(self, user_id, skills, preferred_medium):
+        """Re-encode one user after their profile changed."""
+        if not self._loaded:
+            return
+        with self._lock:
+            row = self._rows.get(user_id)
+            last_active = self._last_active[row] if row is not None else np.nan
+            self._store(user_id, skills, preferred_medium, last_active)
+
+    def update_last_active(self, user_ids, timestamps):
+        """Refresh the recency of users already in the index (timestamps in epoch seconds)."""
+        if not self._loaded:
+            return
+        with self._lock:
+            for user_id, timestamp in zip(user_ids, timestamps):
+                row = self._rows.get(user_id)
+                if row is not None:
+                    self._last_active[row] = timestamp
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._load()
+            self._loaded = True
+
+    def _load(self):
+        started = time.time()
+        connection = db.engine.connect().execution_options(stream_results=True)
+        try:
+            result = connection.execute("SELECT id, skills, preferred_medium, last_active FROM users;")
+            while True:
+                users = result.fetchmany(LOAD_CHUNK_SIZE)
+                if not users:
+                    break
+                with self._lock:
+                    for user in users:
+                        self._store(user[0], user[1], user[2], _timestamp(user[3]))
+        finally:
+            connection.close()
+        print(f"[DEBUG] Loaded skill vectors of {len(self._rows)} users in {time.time() - started:.2f}s.")
+
+    def _ensure_users(self, user_ids):
+        """Encode users created after the index was loaded."""
+        row_of = self._row_of
+        known = np.zeros(len(user_ids), dtype=bool)
+        in_range = user_ids < len(row_of)
+        known[in_range] = row_of[user_ids[in_range]] >= 0
+        missing = [int(user_id) for user_id in user_ids[~known]]
+        if not missing:
+            return
+        query = "SELECT id, skills, preferred_medium, last_active FROM users WHERE id = ANY(:user_ids);"
+        users = db.session.execute(query, {'user_ids': missing}).fetchall()
+        with self._lock:
+            for user in users:
+                self._store(user[0], user[1], user[2], _timestamp(user[3]))
+            # Deleted users score as empty profiles
+            for user_id in missing:
+                if user_id not in self._rows:
+                    self._store(user_id, None, None, np.nan)
+
+    def _store(self, user_id, skills, preferred_medium, last_active):
+        tokens = {f"skill:{skill.strip().lower()}" for skill in skills or [] if skill and skill.strip()}
+        tokens |= {f"medium:{medium.strip().lower()}" for medium in preferred_medium or [] if medium and medium.strip()}
+
+        positions = []
+        for token in tokens:
+            position = self._vocabulary.get(token)
+            if position is None:
+                position = self._vocabulary[token] = len(self._vocabulary)
+            positions.append(position)
+
+        words_needed = max(1, (len(self._vocabulary) + 63) // 64)
+        if words_needed > self._bits.shape[1]:
+            widened = np.zeros((self._bits.shape[0], words_needed * 2), dtype=np.uint64)
+            widened[:, :self._bits.shape[1]] = self._bits
+            self._bits = widened
+
+        row = self._rows.get(user_id)
+        if row is None:
+            row = self._rows[user_id] = len(self._rows)
+            if user_id >= len(self._row_of):
+                grown = np.full(max(1024, user_id * 2), -1, dtype=np.int64)
+                grown[:len(self._row_of)] = self._row_of
+                self._row_of = grown
+            self._row_of[user_id] = row
+            if row >= self._bits.shape[0]:
+                capacity = max(1024, self._bits.shape[0] * 2)
+                self._bits = np.resize(self._bits, (capacity, self._bits.shape[1]))
+                self._bits[row:] = 0
+                self._counts = np.resize(self._counts, capacity)
+                self._last_active = np.resize(self._last_active, capacity)
+
+        vector = np.zeros(self._bits.shape[1], dtype=np.uint64)
+        for position in positions:
+            vector[position // 64] |= np.uint64(1) << np.uint64(position % 64)
+        self._bits[row] = vector
+        self._counts[row] = len(positions)
+        self._last_active[row] = last_active
+
+
+skill_index = SkillIndex()
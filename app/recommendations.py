@@ -0,0 +1,216 @@
+import time
+
+import click
+import numpy as np
+from flask.cli import with_appcontext
+from scipy import sparse
+
+from app import db
+from app.activity import ACTIVE_POOL_DAYS
+
+# Swipes read from the database per round trip
+READ_CHUNK_SIZE = 100000
+
+# Users / liked users processed per block; bounds the size of the intermediate matrices
+USER_BLOCK_SIZE = 2000
+ITEM_BLOCK_SIZE = 2000
+
+# Most similar liked users kept per liked user, and recommendations kept per user
+NEIGHBOURS_PER_ITEM = 50
+RECOMMENDATIONS_PER_USER = 100
+
+
+def build_recommendations(chunk_size=READ_CHUNK_SIZE, top_n=RECOMMENDATIONS_PER_USER):
+    """
+    Rebuild the recommendations table from the swipe history.
+
+    Right swipes form a sparse user x user matrix X (swiper x liked user). Two liked users are
+    similar when the same people swiped right on both (cosine similarity of their columns); only
+    the strongest NEIGHBOURS_PER_ITEM similarities of every liked user are kept. A user's score
+    for a candidate is then the summed similarity between the candidate and everyone the user
+    already liked, i.e. one row of X @ S. Everything past the initial read is done in blocks, so
+    memory stays proportional to the number of swipes, not to the square of the user count.
+    """
+    started = time.time()
+
+    swipers, targets = _read_right_swipes(chunk_size)
+    read_done = time.time()
+    print(f"[INFO] Read {len(swipers)} right swipes in {read_done - started:.1f}s.")
+
+    size = int(max(swipers.max(initial=0), targets.max(initial=0))) + 1
+    likes = sparse.csr_matrix(
+        (np.ones(len(swipers), dtype=np.float32), (swipers, targets)), shape=(size, size)
+    )
+    del swipers, targets
+
+    similarity = _item_similarity(likes)
+    similarity_done = time.time()
+    print(f"[INFO] Computed {similarity.nnz} item similarities in {similarity_done - read_done:.1f}s.")
+
+    written = 0
+    for start in range(0, size, USER_BLOCK_SIZE):
+        end = min(start + USER_BLOCK_SIZE, size)
+        block = likes[start:end]
+        scores = (block @ similarity).tocsr()
+        user_ids, candidate_ids, values = _top_per_row(scores, top_n, start, exclude=block)
+        _write_block(start, end, user_ids, candidate_ids, values)
+        written += len(user_ids)
+
+    # Users created after the swipes were read have no recommendations yet
+    db.session.execute("DELETE FROM recommendations WHERE user_id >= :size;", {'size': size})
+    db.session.commit()
+
+    finished = time.time()
+    print(f"[INFO] Wrote {written} recommendations in {finished - similarity_done:.1f}s.")
+    print(f"[INFO] Recommendations rebuilt in {finished - started:.1f}s.")
+    return {'swipes': likes.nnz, 'recommendations': written, 'seconds': finished - started}
+
+
+def fetch_recommended_ids(current_user_id, collaboration_id, after, limit, hidden_ids=None):
+    """
+    Fetch up to `limit` recommended users from the active pool, best first, skipping users already
+    swiped on or matched with and `hidden_ids`. `after` is the (score, candidate_id) of the last row
+    of the previous page, or None.
+    """
+    query = f"""
+    SELECT r.candidate_id, r.score
+    FROM recommendations r
+    JOIN users c ON c.id = r.candidate_id
+    {"JOIN user_collaborations uc ON uc.user_id = r.candidate_id AND uc.collaboration_id = :collaboration_id" if collaboration_id else ""}
+    WHERE r.user_id = :current_user_id
+      AND c.last_active >= LOCALTIMESTAMP - make_interval(days => :active_days)
+      {"AND r.candidate_id <> ALL(:hidden_ids)" if hidden_ids else ""}
+      {"AND (r.score, -r.candidate_id) < (CAST(:after_score AS REAL), -CAST(:after_id AS INTEGER))" if after else ""}
+      AND NOT EXISTS (
+          SELECT 1 FROM swipes s
+          WHERE s.swiper_id = :current_user_id AND s.target_id = r.candidate_id
+      )
+      AND NOT EXISTS (
+          SELECT 1 FROM match_edges e
+          WHERE e.user_id = :current_user_id AND e.other_id = r.candidate_id
+      )
+    ORDER BY r.score DESC, r.candidate_id
+    LIMIT :limit;
+    """
+    rows = db.session.execute(query, {
+        'current_user_id': current_user_id,
+        'collaboration_id': collaboration_id,
+        'after_score': after[0] if after else None,
+        'after_id': after[1] if after else None,
+        'active_days': ACTIVE_POOL_DAYS,
+        'hidden_ids': hidden_ids,
+        'limit': limit,
+    }).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+
+def _read_right_swipes(chunk_size):
+    """Stream every right swipe through a server-side cursor, chunk_size rows at a time."""
+    swiper_chunks = []
+    target_chunks = []
+    connection = db.engine.connect().execution_options(stream_results=True)
+    try:
+        result = connection.execute("SELECT swiper_id, target_id FROM swipes WHERE direction = 'right';")
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            pairs = np.fromiter(
+                (value for row in rows for value in row), dtype=np.int32, count=2 * len(rows)
+            ).reshape(-1, 2)
+            swiper_chunks.append(pairs[:, 0].copy())
+            target_chunks.append(pairs[:, 1].copy())
+    finally:
+        connection.close()
+
+    if not swiper_chunks:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(swiper_chunks), np.concatenate(target_chunks)
+
+
+def _item_similarity(likes):
+    """Cosine similarity between the columns of `likes`, pruned to the strongest neighbours per column."""
+    popularity = np.asarray(likes.sum(axis=0)).ravel()
+    inverse_norm = np.divide(1.0, np.sqrt(popularity), out=np.zeros_like(popularity), where=popularity > 0)
+    normalized = (likes @ sparse.diags(inverse_norm.astype(np.float32))).tocsc()
+    normalized_t = normalized.T.tocsr()
+
+    rows, columns, values = [], [], []
+    size = likes.shape[1]
+    for start in range(0, size, ITEM_BLOCK_SIZE):
+        end = min(start + ITEM_BLOCK_SIZE, size)
+        block = (normalized_t[start:end] @ normalized).tocsr()
+        block_rows, block_columns, block_values = _top_per_row(block, NEIGHBOURS_PER_ITEM, start)
+        rows.append(block_rows)
+        columns.append(block_columns)
+        values.append(block_values)
+
+    return sparse.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))), shape=(size, size)
+    )
+
+
+def _top_per_row(matrix, k, row_offset, exclude=None):
+    """
+    Keep the `k` largest entries of every row of a CSR matrix, skipping the diagonal and any column
+    set in the same row of `exclude`. Returns (row ids, column ids, values) as flat arrays.
+    """
+    rows, columns, values = [], [], []
+    for i in range(matrix.shape[0]):
+        begin, end = matrix.indptr[i], matrix.indptr[i + 1]
+        if begin == end:
+            continue
+        row_columns = matrix.indices[begin:end]
+        row_values = matrix.data[begin:end]
+
+        keep = row_columns != row_offset + i
+        if exclude is not None:
+            keep &= ~np.isin(row_columns, exclude.indices[exclude.indptr[i]:exclude.indptr[i + 1]])
+        row_columns = row_columns[keep]
+        row_values = row_values[keep]
+
+        if len(row_values) > k:
+            top = np.argpartition(-row_values, k - 1)[:k]
+            row_columns = row_columns[top]
+            row_values = row_values[top]
+
+        rows.append(np.full(len(row_columns), row_offset + i, dtype=np.int32))
+        columns.append(row_columns)
+        values.append(row_values)
+
+    if not rows:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    return np.concatenate(rows), np.concatenate(columns), np.concatenate(values)
+
+
+def _write_block(start, end, user_ids, candidate_ids, scores):
+    """Replace the recommendations of users start..end-1 in one transaction."""
+    db.session.execute(
+        "DELETE FROM recommendations WHERE user_id >= :start AND user_id < :end;",
+        {'start': start, 'end': end},
+    )
+    if len(user_ids):
+        # Ids of users deleted since the swipes were read are dropped by the joins
+        db.session.execute(
+            """
+            INSERT INTO recommendations (user_id, candidate_id, score)
+            SELECT r.user_id, r.candidate_id, r.score
+            FROM unnest(CAST(:user_ids AS INTEGER[]), CAST(:candidate_ids AS INTEGER[]), CAST(:scores AS REAL[]))
+                 AS r(user_id, candidate_id, score)
+            JOIN users u ON u.id = r.user_id
+            JOIN users c ON c.id = r.candidate_id;
+            """,
+            {
+                'user_ids': user_ids.tolist(),
+                'candidate_ids': candidate_ids.tolist(),
+                'scores': scores.tolist(),
+            },
+        )
+    db.session.commit()
+
+
+@click.command('build-recommendations')
+@with_appcontext
+def build_recommendations_command():
+    """Rebuild the "people like you swiped on" recommendations from the swipe history."""
+    build_recommendations()
@@ -0,0 +1,59 @@
+import pickle
+import queue
+import threading
+
+import socketio as python_socketio
+
+# URL scheme of the in-process backend
+LOCAL_SCHEME = 'local://'
+
+
+class LocalPubSubManager(python_socketio.PubSubManager):
+    """
+    Stand-in for a real message queue that connects the Socket.IO servers of one Python process,
+    e.g. several SocketIO instances created by a test to play the part of several workers.
+    Messages are pickled on publish like the network backends do, so anything that would not
+    survive Redis does not survive this either. Every server gets every message, its own
+    included, as with Redis pub/sub.
+    """
+
+    name = 'local'
+
+    _lock = threading.Lock()
+    _subscribers = {}  # channel -> queues of the servers listening on it
+
+    def __init__(self, url=LOCAL_SCHEME, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.url = url
+
+    def _publish(self, data):
+        message = pickle.dumps(data)
+        with self._lock:
+            subscribers = list(self._subscribers.get(self.channel, ()))
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def _listen(self):
+        subscriber = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(self.channel, []).append(subscriber)
+        try:
+            while True:
+                yield subscriber.get()
+        finally:
+            with self._lock:
+                self._subscribers[self.channel].remove(subscriber)
+
+
+def message_queue_options(url, channel):
+    """
+    SocketIO.init_app() options that route emits through the message queue at `url`, so an emit
+    to a room reaches its members on every worker and host. `local://` selects the in-process
+    LocalPubSubManager; any other URL (redis://, amqp://, kafka://, ...) is handed to
+    Flask-SocketIO, which picks the matching backend. An empty url keeps emits in this process.
+    """
+    if not url:
+        return {}
+    if url.startswith(LOCAL_SCHEME):
+        return {'client_manager': LocalPubSubManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
@@ -0,0 +1,147 @@
+import atexit
+import threading
+import time
+
+from app import db
+
+# Seconds between two flushes of the buffered counters to the database
+STATS_FLUSH_INTERVAL = 5
+
+# user_stats columns counted in memory, in the order of the buffered counts
+BUFFERED_COLUMNS = ('profile_views', 'swipes_received', 'right_swipes_received')
+
+
+class UserStatsCounter:
+    """
+    Write-behind buffer for the user_stats counters of the user being looked at or swiped on:
+    profile_views, swipes_received and right_swipes_received (see migrations/012_user_stats.sql).
+    A view or a committed swipe only bumps an in-memory counter; every STATS_FLUSH_INTERVAL
+    seconds the counts of all users are added in one statement, so a popular profile costs one
+    row update per flush instead of one lock per view or swipe, taken inside the swiper's
+    transaction.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pending = {}  # user id -> [views, swipes received, right swipes received] not written yet
+        self._worker_started = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self._flush_on_exit)
+
+    def record_view(self, viewer_id, viewed_id):
+        """Count a view of `viewed_id`'s profile. Users looking at their own profile are not counted."""
+        if viewer_id == viewed_id:
+            return
+        self._add(viewed_id, (1, 0, 0))
+
+    def record_swipes(self, swipes):
+        """Count committed (target id, direction) swipes as received by their targets."""
+        for target_id, direction in swipes:
+            self._add(target_id, (0, 1, 1 if direction == 'right' else 0))
+
+    def _add(self, user_id, counts):
+        with self._lock:
+            pending = self._pending.setdefault(user_id, [0] * len(BUFFERED_COLUMNS))
+            for i, count in enumerate(counts):
+                pending[i] += count
+            if not self._worker_started:
+                self._worker_started = True
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def pending(self, user_id):
+        """Counts of `user_id` made by this process but not written yet, by column."""
+        with self._lock:
+            return dict(zip(BUFFERED_COLUMNS, self._pending.get(user_id, [0] * len(BUFFERED_COLUMNS))))
+
+    def flush(self):
+        """Add all buffered counts in one statement. Returns the number of users written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        # Sorted so concurrent flushes from several workers lock rows in the same order
+        user_ids = sorted(pending)
+        query = """
+        INSERT INTO user_stats AS s (user_id, profile_views, swipes_received, right_swipes_received)
+        SELECT v.user_id, v.views, v.swipes, v.right_swipes
+        FROM unnest(
+            CAST(:user_ids AS INTEGER[]), CAST(:views AS BIGINT[]),
+            CAST(:swipes AS INTEGER[]), CAST(:right_swipes AS INTEGER[])
+        ) AS v(user_id, views, swipes, right_swipes)
+        JOIN users u ON u.id = v.user_id
+        ORDER BY v.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET profile_views = s.profile_views + EXCLUDED.profile_views,
+            swipes_received = s.swipes_received + EXCLUDED.swipes_received,
+            right_swipes_received = s.right_swipes_received + EXCLUDED.right_swipes_received;
+        """
+        try:
+            db.session.execute(query, {
+                'user_ids': user_ids,
+                'views': [pending[user_id][0] for user_id in user_ids],
+                'swipes': [pending[user_id][1] for user_id in user_ids],
+                'right_swipes': [pending[user_id][2] for user_id in user_ids],
+            })
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the counts back so the next flush writes them
+            with self._lock:
+                for user_id, counts in pending.items():
+                    current = self._pending.setdefault(user_id, [0] * len(BUFFERED_COLUMNS))
+                    for i, count in enumerate(counts):
+                        current[i] += count
+            raise
+        return len(user_ids)
+
+    def _run(self):
+        while True:
+            time.sleep(STATS_FLUSH_INTERVAL)
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                print(f"[ERROR] Failed to write user stats counters: {e}")
+
+    def _flush_on_exit(self):
+        if not self._pending or self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"[ERROR] Failed to write user stats counters on shutdown: {e}")
+
+
+def fetch_stats(user_id):
+    """
+    Read the counters of `user_id`, plus the counts this process has not written yet. Users without
+    a user_stats row (created after the migration and never swiped on or viewed) have all zeros.
+    """
+    query = """
+    SELECT swipes_given, right_swipes_given, swipes_received, right_swipes_received, matches, profile_views
+    FROM user_stats
+    WHERE user_id = :user_id;
+    """
+    row = db.session.execute(query, {'user_id': user_id}).fetchone() or (0, 0, 0, 0, 0, 0)
+    swipes_given, right_swipes_given, swipes_received, right_swipes_received, matches, views = row
+    pending = user_stats_counter.pending(user_id)
+    return {
+        'swipes_given': swipes_given,
+        'right_swipes_given': right_swipes_given,
+        'swipes_received': swipes_received + pending['swipes_received'],
+        'right_swipes_received': right_swipes_received + pending['right_swipes_received'],
+        'matches': matches,
+        # Share of the user's right swipes that became a match
+        'match_rate': round(matches / right_swipes_given, 4) if right_swipes_given else 0.0,
+        'profile_views': views + pending['profile_views'],
+    }
+
+
+user_stats_counter = UserStatsCounter()
@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict, deque
+
+from app import db
+
+# Number of most recent swipes of a user that can be undone
+UNDO_DEPTH = 10
+
+# Most users whose recent swipes are kept in memory; the least recently used one is dropped beyond this
+MAX_UNDO_USERS = 50000
+
+
+class RecentSwipes:
+    """
+    For every active user, a ring buffer of their last UNDO_DEPTH swipes as (target id, direction),
+    newest last. Swipe routes write every committed swipe through to it, and /match/undo_swipe
+    answers "is this one of my recent swipes" from it without touching the swipes table. A user
+    without a ring (first undo, or swipes made through another process) gets one from a bounded
+    read of their newest swipes, so nothing here grows with the user's swipe history.
+
+    The database has the final say: undo_swipe() (see migrations/011_undo_swipe.sql) checks the
+    swipe against the same window again, so a ring that missed a swipe made elsewhere can only
+    cause an undo to be refused, never the wrong swipe to be undone.
+    Both windows follow swipes.seq, the order the swipes were made in.
+    """
+
+    def __init__(self, depth=UNDO_DEPTH, max_users=MAX_UNDO_USERS):
+        self.depth = depth
+        self.max_users = max_users
+        self._rings = OrderedDict()  # user id -> deque of (target id, direction)
+        self._lock = threading.Lock()
+
+    def record(self, user_id, swipes):
+        """Append committed (target id, direction) swipes of `user_id`, oldest first."""
+        with self._lock:
+            ring = self._rings.get(user_id)
+            if ring is None:
+                return
+            self._rings.move_to_end(user_id)
+            ring.extend(swipes)
+
+    def find(self, user_id, target_id):
+        """Direction of the swipe of `user_id` on `target_id` if it is a recent one, else None."""
+        ring = self._get_ring(user_id)
+        with self._lock:
+            for swiped_id, direction in ring:
+                if swiped_id == target_id:
+                    return direction
+        return None
+
+    def discard(self, user_id, target_id):
+        """Forget the swipe of `user_id` on `target_id` after it was undone."""
+        with self._lock:
+            ring = self._rings.get(user_id)
+            if ring is None:
+                return
+            kept = [swipe for swipe in ring if swipe[0] != target_id]
+            ring.clear()
+            ring.extend(kept)
+
+    def _get_ring(self, user_id):
+        with self._lock:
+            ring = self._rings.get(user_id)
+            if ring is not None:
+                self._rings.move_to_end(user_id)
+                return ring
+
+        query = """
+        SELECT target_id, direction
+        FROM swipes
+        WHERE swiper_id = :user_id
+        ORDER BY seq DESC
+        LIMIT :depth;
+        """
+        rows = db.session.execute(query, {'user_id': user_id, 'depth': self.depth}).fetchall()
+        ring = deque(((row[0], row[1]) for row in reversed(rows)), maxlen=self.depth)
+        with self._lock:
+            ring = self._rings.setdefault(user_id, ring)
+            while len(self._rings) > self.max_users:
+                self._rings.popitem(last=False)
+        return ring
+
+
+recent_swipes = RecentSwipes()
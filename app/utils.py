@@ -1,5 +1,49 @@
+import base64
+import json
+from datetime import datetime
+
 from flask_jwt_extended import decode_token
 
 def get_user_id_from_token(token):
+    """
+    User id of an access token, verified like @jwt_required() does. Raises ValueError for any
+    other kind of token (a refresh token must not stand in for an access token).
+    """
     decoded_token = decode_token(token)
+    if decoded_token.get('type') != 'access':
+        raise ValueError("Not an access token")
     return decoded_token['sub']
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page into an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def decode_time_cursor(cursor):
+    """
+    Decode a [timestamp, id] cursor of a list ordered by time and id. Raises ValueError if it is
+    malformed or not of that shape.
+    """
+    values = decode_cursor(cursor)
+    if (not isinstance(values, list) or len(values) != 2 or not isinstance(values[0], str)
+            or not isinstance(values[1], int) or isinstance(values[1], bool)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    try:
+        datetime.fromisoformat(values[0])
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return values[0], values[1]
+
+def inbox_room(user_id):
+    """Room of every socket connection of `user_id`; all their chat events are emitted to it."""
+    return f"user:{user_id}"
+
+def conversation_id(user_id, other_id):
+    """Id of the conversation between two users, the same from both sides."""
+    return f"{min(user_id, other_id)}-{max(user_id, other_id)}"
@@ -0,0 +1,78 @@
+"""
+Load test of profile boosts (app/boosts.py): /match/get_others latency with no boosts against
+10k concurrently active boosts, and against 10k boosts with a new one starting before every
+request (so every deck looks at the boosts again).
+
+    DATABASE_URL=postgresql://... python bench/boost_deck_latency.py [boosts] [viewers] [requests per viewer]
+"""
+import sys
+import time
+
+from common import create_bench_app, seed_users, auth_headers, report
+
+from app import db
+from app.boosts import boost_queue
+
+BOOSTS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+VIEWERS = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+REQUESTS = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+
+def deck_latencies(client, viewers, headers, before_request=None):
+    """Time the warm first-page requests of every viewer; each viewer's first request fills their deck."""
+    samples = []
+    for viewer_id in viewers:
+        client.get('/match/get_others', headers=headers[viewer_id])
+        for _ in range(REQUESTS):
+            if before_request:
+                before_request()
+            start = time.perf_counter()
+            response = client.get('/match/get_others', headers=headers[viewer_id])
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+    return samples
+
+
+def main():
+    app = create_bench_app()
+    client = app.test_client()
+    with app.app_context():
+        user_ids = seed_users(BOOSTS + 3 * VIEWERS)
+        boosted, viewers = user_ids[:BOOSTS], user_ids[BOOSTS:]
+        headers = {viewer_id: auth_headers(viewer_id) for viewer_id in viewers}
+        db.session.execute("DELETE FROM profile_boosts WHERE user_id = ANY(:user_ids);", {'user_ids': user_ids})
+        db.session.commit()
+
+    # Every scenario gets viewers whose decks were never built
+    groups = [viewers[i * VIEWERS:(i + 1) * VIEWERS] for i in range(3)]
+    report('no boosts', deck_latencies(client, groups[0], headers))
+
+    with app.app_context():
+        db.session.execute("""
+        INSERT INTO profile_boosts (user_id, weight, expires_at)
+        SELECT u, 0.5 + random(), LOCALTIMESTAMP + interval '1 hour'
+        FROM unnest(CAST(:user_ids AS INTEGER[])) AS u;
+        """, {'user_ids': boosted})
+        db.session.commit()
+        start = time.perf_counter()
+        boost_queue._sync()
+        print(f"Loaded {len(boost_queue._heap)} boosts in {(time.perf_counter() - start) * 1000:.0f} ms")
+        db.session.rollback()
+    report(f'{BOOSTS} active boosts', deck_latencies(client, groups[1], headers))
+
+    next_boost = iter(range(-1, -10 ** 9, -1))
+
+    def start_boost():
+        # In memory only, with ids the database never hands out
+        now = time.time()
+        boost_queue.add(next(next_boost), boosted[0], 1.0, now, now + 3600, {'id': boosted[0]})
+
+    report(f'{BOOSTS} active boosts, new boost per request', deck_latencies(client, groups[2], headers, start_boost))
+
+    with app.app_context():
+        db.session.execute("DELETE FROM profile_boosts WHERE user_id = ANY(:user_ids);", {'user_ids': boosted})
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Latency of /chat/history pages in a conversation of a million messages: the newest page, and pages
+taken from the middle and the oldest end of the conversation through the `before` cursor. Also
+prints the plan of one page, which should be a backward range scan of chats_conversation_idx
+(see migrations/014_chat_history_index.sql) stopping after `limit` rows.
+
+The messages are inserted once, between the first two bench users, and kept for later runs.
+
+    DATABASE_URL=postgresql://... python bench/chat_history_latency.py [messages] [requests]
+"""
+import sys
+import time
+
+from common import create_bench_app, seed_users, auth_headers, report
+
+from app import db
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+REQUESTS = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+# Messages inserted per statement while seeding the conversation
+SEED_CHUNK_SIZE = 100000
+
+
+def seed_conversation(low_id, high_id):
+    """Fill the conversation of the two users up to MESSAGES messages, one second apart."""
+    params = {'low_id': low_id, 'high_id': high_id}
+    count = db.session.execute("""
+    SELECT COUNT(*) FROM chats
+    WHERE LEAST(sender_id, receiver_id) = :low_id AND GREATEST(sender_id, receiver_id) = :high_id;
+    """, params).scalar()
+    started = time.perf_counter()
+    while count < MESSAGES:
+        chunk = min(SEED_CHUNK_SIZE, MESSAGES - count)
+        db.session.execute("""
+        INSERT INTO chats (sender_id, receiver_id, message, sent_at)
+        SELECT CASE WHEN g % 2 = 0 THEN :low_id ELSE :high_id END,
+               CASE WHEN g % 2 = 0 THEN :high_id ELSE :low_id END,
+               'bench message ' || g,
+               TIMESTAMP '2020-01-01' + g * interval '1 second'
+        FROM generate_series(:start, :stop) AS g;
+        """, dict(params, start=count + 1, stop=count + chunk))
+        db.session.commit()
+        count += chunk
+        print(f"Seeded {count} messages")
+    if time.perf_counter() - started > 1:
+        db.session.execute("ANALYZE chats;")
+        db.session.commit()
+    return count
+
+
+def main():
+    app = create_bench_app()
+    client = app.test_client()
+    with app.app_context():
+        low_id, high_id = seed_users(2)
+        headers = auth_headers(low_id)
+        count = seed_conversation(low_id, high_id)
+        # Cursors in the middle and near the oldest end of the conversation
+        cursor_query = """
+        SELECT id FROM chats
+        WHERE LEAST(sender_id, receiver_id) = :low_id AND GREATEST(sender_id, receiver_id) = :high_id
+        ORDER BY sent_at DESC, id DESC
+        OFFSET :offset LIMIT 1;
+        """
+        cursors = [
+            db.session.execute(cursor_query, {'low_id': low_id, 'high_id': high_id, 'offset': offset}).scalar()
+            for offset in (count // 2, count - 100)
+        ]
+        plan = db.session.execute("""
+        EXPLAIN (ANALYZE, BUFFERS)
+        SELECT id, sender_id, message, sent_at
+        FROM chats
+        WHERE LEAST(sender_id, receiver_id) = :low_id
+          AND GREATEST(sender_id, receiver_id) = :high_id
+          AND (sent_at, id) < (SELECT sent_at, id FROM chats WHERE id = :before)
+        ORDER BY sent_at DESC, id DESC
+        LIMIT 51;
+        """, {'low_id': low_id, 'high_id': high_id, 'before': cursors[0]}).fetchall()
+        db.session.rollback()
+    print('\n'.join(row[0] for row in plan))
+
+    def page_latencies(url):
+        samples = []
+        for _ in range(REQUESTS):
+            start = time.perf_counter()
+            response = client.get(url, headers=headers)
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+            assert len(response.get_json()['messages']) == 50
+        return samples
+
+    report(f'newest page of {count}', page_latencies(f'/chat/history/{high_id}'))
+    report('page from the middle', page_latencies(f'/chat/history/{high_id}?before={cursors[0]}'))
+    report('page from the oldest end', page_latencies(f'/chat/history/{high_id}?before={cursors[1]}'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Throughput of storing socket chat messages: one INSERT and COMMIT per message (what handle_message
+did before app/chat_writer.py) against the batched write-behind ChatWriter.
+
+Writes real rows to chats, so run it against a scratch database with migrations applied:
+
+    DATABASE_URL=postgresql://... python bench/chat_writer_throughput.py [messages] [users]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('EXCLUSION_SNAPSHOT_PATH', '')
+
+from app import create_app, db  # noqa: E402
+from app.chat_writer import chat_writer  # noqa: E402
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+USERS = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+
+def pairs(user_ids):
+    for i in range(MESSAGES):
+        sender_id = user_ids[i % len(user_ids)]
+        receiver_id = user_ids[(i * 7 + 1) % len(user_ids)]
+        yield sender_id, receiver_id, f"bench message {i}"
+
+
+def commit_per_message(user_ids):
+    query = "INSERT INTO chats (sender_id, receiver_id, message) VALUES (:sender_id, :receiver_id, :message);"
+    for sender_id, receiver_id, message in pairs(user_ids):
+        db.session.execute(query, {'sender_id': sender_id, 'receiver_id': receiver_id, 'message': message})
+        db.session.commit()
+
+
+def batched(user_ids):
+    last_id = None
+    for sender_id, receiver_id, message in pairs(user_ids):
+        last_id = chat_writer.submit(sender_id, receiver_id, message)['id']
+    # Done once the last message is stored
+    while db.session.execute("SELECT 1 FROM chats WHERE id = :id;", {'id': last_id}).fetchone() is None:
+        db.session.rollback()
+        time.sleep(0.005)
+    db.session.rollback()
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        user_ids = [row[0] for row in db.session.execute(
+            "SELECT id FROM users ORDER BY id LIMIT :count;", {'count': USERS}
+        ).fetchall()]
+        if len(user_ids) < 2:
+            sys.exit("Needs at least two users.")
+
+        for name, run in (('commit per message', commit_per_message), ('batched writer', batched)):
+            start = time.perf_counter()
+            run(user_ids)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>20}: {MESSAGES} messages in {elapsed:.2f}s, {MESSAGES / elapsed:,.0f} msg/s")
+
+
+if __name__ == '__main__':
+    main()
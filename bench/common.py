@@ -0,0 +1,66 @@
+"""
+Helpers shared by the benchmarks in this folder. The benchmarks write to the database they run
+against (bench users, swipes, chats, boosts), so point DATABASE_URL at a scratch database with the
+migrations applied, never at production.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('EXCLUSION_SNAPSHOT_PATH', '')
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+
+# Username prefix of the users created by seed_users()
+BENCH_USER_PREFIX = 'bench_user_'
+
+
+def create_bench_app(**engine_options):
+    """The app, with `engine_options` (e.g. pool_size) passed to the SQLAlchemy engine."""
+    app = create_app()
+    if engine_options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+    return app
+
+
+def seed_users(count):
+    """
+    Make sure `count` bench users exist and are in the active pool, and return their ids in id
+    order. Needs an app context.
+    """
+    db.session.execute("""
+    INSERT INTO users (username, password_hash, bio, skills, location, preferred_medium, last_active)
+    SELECT :prefix || g, 'x', 'bench user', ARRAY['skill' || (g % 50), 'skill' || (g % 7)], 'bench',
+           ARRAY['online'], LOCALTIMESTAMP
+    FROM generate_series(1, :count) AS g
+    ON CONFLICT (username) DO NOTHING;
+    """, {'prefix': BENCH_USER_PREFIX, 'count': count})
+    db.session.execute(
+        "UPDATE users SET last_active = LOCALTIMESTAMP WHERE username LIKE :pattern;",
+        {'pattern': BENCH_USER_PREFIX + '%'}
+    )
+    db.session.commit()
+    rows = db.session.execute(
+        "SELECT id FROM users WHERE username LIKE :pattern ORDER BY id LIMIT :count;",
+        {'pattern': BENCH_USER_PREFIX + '%', 'count': count}
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def auth_headers(user_id):
+    """Authorization header of `user_id`. Needs an app context."""
+    return {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+
+
+def percentile(samples, p):
+    """The `p`th percentile (0-100) of `samples`, nearest rank."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+def report(name, seconds):
+    """Print p50 / p99 / max of a list of durations in seconds, in milliseconds."""
+    print(f"{name:>44}: n={len(seconds)}  p50 {percentile(seconds, 50) * 1000:.2f} ms  "
+          f"p99 {percentile(seconds, 99) * 1000:.2f} ms  max {max(seconds) * 1000:.2f} ms")
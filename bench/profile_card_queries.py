@@ -0,0 +1,106 @@
+"""
+Queries and time per /match/get_user view: the four queries the route ran before
+app/card_cache.py (user, swipe check, collaborations, collections), served from a bench-only route
+so both go through the same request handling, against the single card query on a cache miss and
+the swipe check alone on a cache hit. Queries are counted with an SQLAlchemy
+before_cursor_execute listener, on the request thread only (background flushes are not counted).
+
+    DATABASE_URL=postgresql://... python bench/profile_card_queries.py [views] [profiles]
+"""
+import sys
+import threading
+import time
+
+from flask import jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import event
+
+from common import create_bench_app, seed_users, auth_headers
+
+from app import db
+from app.card_cache import profile_cards
+
+VIEWS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+PROFILES = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+
+def four_queries(viewer_id, user_id):
+    """What get_user ran per view before the card query and cache."""
+    params = {'user_id': user_id, 'current_user_id': viewer_id}
+    user = db.session.execute("""
+    SELECT id, username, bio, skills, location, availability, profile_picture FROM users WHERE id = :user_id;
+    """, params).fetchone()
+    already_swiped = db.session.execute("""
+    SELECT EXISTS (
+        SELECT 1 FROM swipes
+        WHERE swiper_id = :current_user_id AND target_id = :user_id AND direction = 'right'
+    );
+    """, params).scalar()
+    collaborations = db.session.execute("""
+    SELECT c.id, c.name, c.description
+    FROM collaborations c
+    JOIN user_collaborations uc ON c.id = uc.collaboration_id
+    WHERE uc.user_id = :user_id;
+    """, params).fetchall()
+    collections = db.session.execute("SELECT id, name FROM collections WHERE user_id = :user_id;", params).fetchall()
+    return jsonify({
+        'id': user[0], 'username': user[1], 'bio': user[2], 'skills': user[3], 'location': user[4],
+        'availability': user[5], 'profile_picture': user[6],
+        'collaborations': [{'id': c[0], 'name': c[1], 'description': c[2]} for c in collaborations],
+        'collections': [{'id': c[0], 'name': c[1]} for c in collections],
+        'already_swiped_right': already_swiped,
+    }), 200
+
+
+@jwt_required()
+def four_queries_route(user_id):
+    return four_queries(int(get_jwt_identity()), user_id)
+
+
+def main():
+    app = create_bench_app()
+    app.add_url_rule('/bench/four_queries/<int:user_id>', view_func=four_queries_route)
+    client = app.test_client()
+    with app.app_context():
+        user_ids = seed_users(PROFILES + 1)
+        viewer_id, profiles = user_ids[0], user_ids[1:]
+        headers = auth_headers(viewer_id)
+        engine = db.engine
+
+    counted = threading.get_ident()
+    queries = [0]
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == counted:
+            queries[0] += 1
+
+    def measure(name, view):
+        queries[0] = 0
+        start = time.perf_counter()
+        for i in range(VIEWS):
+            view(profiles[i % len(profiles)])
+        elapsed = time.perf_counter() - start
+        print(f"{name:>20}: {queries[0] / VIEWS:.2f} queries/view  {elapsed / VIEWS * 1000:.2f} ms/view")
+
+    def get(url):
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.status_code
+
+    def old(user_id):
+        get(f'/bench/four_queries/{user_id}')
+
+    def new(user_id):
+        get(f'/match/get_user/{user_id}')
+
+    def cold(user_id):
+        profile_cards.invalidate(user_id)
+        new(user_id)
+
+    measure('four queries', old)
+    measure('card, cold cache', cold)
+    measure('card, warm cache', new)
+
+
+if __name__ == '__main__':
+    main()
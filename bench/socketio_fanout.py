@@ -0,0 +1,127 @@
+"""
+Multi-worker Socket.IO check and fan-out benchmark. Several python-socketio servers share one
+message queue (the in-process LocalPubSubManager of app/socket_queue.py) and play the part of
+gunicorn workers; clients connect to them over engine.io long-polling through werkzeug test
+clients, so no network or browser is needed. It checks that
+
+  - an emit to a room made on one worker reaches the room's members on every worker, once, and
+  - a long-polling session only works on the worker that opened it: the same sid sent to another
+    worker is refused, which is why long-polling needs sticky sessions (see the README),
+
+then times how long emits made on one worker take to reach every client.
+
+    python bench/socketio_fanout.py [workers] [clients per worker] [emits]
+"""
+import json
+import sys
+import threading
+import time
+
+import socketio as python_socketio
+from werkzeug.test import Client
+
+from common import report
+
+from app.socket_queue import LocalPubSubManager
+
+WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+EMITS = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+# Room every bench client joins on connect
+ROOM = 'fanout'
+
+# Engine.io packet separator of a long-polling payload
+RECORD_SEPARATOR = '\x1e'
+
+
+def make_worker(channel):
+    server = python_socketio.Server(async_mode='threading', client_manager=LocalPubSubManager(channel=channel))
+
+    @server.event
+    def connect(sid, environ):
+        server.enter_room(sid, ROOM)
+
+    return Client(python_socketio.WSGIApp(server)), server
+
+
+class PollingClient:
+    """A Socket.IO client speaking engine.io long-polling to one worker."""
+
+    def __init__(self, http):
+        self.http = http
+        response = http.get('/socket.io/?EIO=4&transport=polling')
+        assert response.status_code == 200, response.status_code
+        self.sid = json.loads(response.get_data(as_text=True)[1:])['sid']
+        self.post('40')
+        packets = self.poll()
+        assert packets and packets[0].startswith('40'), packets
+
+    def url(self):
+        return f'/socket.io/?EIO=4&transport=polling&sid={self.sid}'
+
+    def post(self, payload):
+        response = self.http.post(self.url(), data=payload)
+        assert response.status_code == 200, response.status_code
+
+    def poll(self):
+        """Wait for the next payload and return its packets, answering pings."""
+        response = self.http.get(self.url())
+        assert response.status_code == 200, response.status_code
+        packets = response.get_data(as_text=True).split(RECORD_SEPARATOR)
+        if '2' in packets:
+            self.post('3')
+        return [packet for packet in packets if packet != '2']
+
+
+def check_sticky_sessions(workers):
+    client = PollingClient(workers[0][0])
+    response = workers[1][0].get(client.url())
+    assert response.status_code == 400, response.status_code
+    print(f"Long-polling sid of worker 0 on worker 1: HTTP {response.status_code} {response.get_data(as_text=True)!r}")
+
+
+def main():
+    workers = [make_worker('bench-fanout') for _ in range(WORKERS)]
+    check_sticky_sessions(workers)
+
+    clients = [PollingClient(workers[i % WORKERS][0]) for i in range(WORKERS * CLIENTS)]
+    received = {client.sid: [] for client in clients}  # sid -> (emit number, received at)
+
+    def listen(client):
+        while len(received[client.sid]) < EMITS:
+            for packet in client.poll():
+                if packet.startswith('42'):
+                    event, data = json.loads(packet[2:])
+                    received[client.sid].append((data['n'], time.perf_counter()))
+
+    listeners = [threading.Thread(target=listen, args=(client,), daemon=True) for client in clients]
+    for listener in listeners:
+        listener.start()
+
+    sent_at = []
+    emitter = workers[0][1]
+    for n in range(EMITS):
+        sent_at.append(time.perf_counter())
+        emitter.emit('bench', {'n': n}, to=ROOM)
+        time.sleep(0.005)
+    for listener in listeners:
+        listener.join(timeout=30)
+
+    missing = sum(EMITS - len(set(n for n, _ in messages)) for messages in received.values())
+    duplicates = sum(len(messages) - len(set(n for n, _ in messages)) for messages in received.values())
+    print(f"{WORKERS} workers, {len(clients)} clients, {EMITS} emits from worker 0: "
+          f"{missing} missing, {duplicates} duplicated deliveries")
+    report('emit to delivery', [at - sent_at[n] for messages in received.values() for n, at in messages])
+    # Time until the slowest client of every emit had it
+    last = {}
+    for messages in received.values():
+        for n, at in messages:
+            last[n] = max(last.get(n, 0), at)
+    report('emit to last client', [at - sent_at[n] for n, at in last.items()])
+    if missing or duplicates:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
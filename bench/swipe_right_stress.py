@@ -0,0 +1,78 @@
+"""
+Concurrency stress test of /match/swipe_right (migrations/002_record_swipe_right.sql): both users
+of thousands of pairs swipe right on each other at the same time, in shuffled order, from many
+threads with their own database connections. Fails unless every swipe is stored, every pair has
+exactly one match, and exactly one side of every pair was told it is a match. Reports latency.
+
+    DATABASE_URL=postgresql://... python bench/swipe_right_stress.py [pairs] [threads]
+"""
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import create_bench_app, seed_users, auth_headers, report
+
+from app import db
+
+PAIRS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+
+
+def main():
+    app = create_bench_app(pool_size=THREADS, max_overflow=0)
+    with app.app_context():
+        user_ids = seed_users(2 * PAIRS)
+        headers = {user_id: auth_headers(user_id) for user_id in user_ids}
+        db.session.execute("DELETE FROM swipes WHERE swiper_id = ANY(:user_ids) OR target_id = ANY(:user_ids);",
+                           {'user_ids': user_ids})
+        db.session.execute("DELETE FROM matches WHERE user1_id = ANY(:user_ids) OR user2_id = ANY(:user_ids);",
+                           {'user_ids': user_ids})
+        db.session.commit()
+
+    pairs = [(user_ids[2 * i], user_ids[2 * i + 1]) for i in range(PAIRS)]
+    swipes = [(a, b) for a, b in pairs] + [(b, a) for a, b in pairs]
+    random.shuffle(swipes)
+
+    def swipe(swipe):
+        swiper_id, target_id = swipe
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post(f'/match/swipe_right/{target_id}', headers=headers[swiper_id])
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, (response.status_code, response.get_json())
+        return swipe, response.get_json()['is_match'], elapsed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(swipe, swipes))
+    elapsed = time.perf_counter() - start
+
+    told = {}
+    for (swiper_id, target_id), is_match, _ in results:
+        key = (min(swiper_id, target_id), max(swiper_id, target_id))
+        told[key] = told.get(key, 0) + is_match
+
+    with app.app_context():
+        stored_swipes = db.session.execute(
+            "SELECT COUNT(*) FROM swipes WHERE swiper_id = ANY(:user_ids) AND direction = 'right';",
+            {'user_ids': user_ids}
+        ).scalar()
+        stored_matches = dict(db.session.execute("""
+        SELECT user1_id, COUNT(*) FROM matches WHERE user1_id = ANY(:user_ids) GROUP BY user1_id;
+        """, {'user_ids': user_ids}).fetchall())
+        db.session.rollback()
+
+    lost_swipes = len(swipes) - stored_swipes
+    lost_matches = [pair for pair in pairs if stored_matches.get(pair[0]) != 1]
+    wrong_flags = [pair for pair in pairs if told.get(pair) != 1]
+    print(f"{len(swipes)} swipes from {THREADS} threads in {elapsed:.2f}s, {len(swipes) / elapsed:,.0f} swipes/s")
+    print(f"lost swipes: {lost_swipes}  pairs without exactly one match: {len(lost_matches)}  "
+          f"pairs without exactly one is_match: {len(wrong_flags)}")
+    report('swipe_right', [result[2] for result in results])
+    if lost_swipes or lost_matches or wrong_flags:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+-- 001: normalized swipes table
+--
+-- Replaces the users.swipe_right / users.swipe_left INTEGER[] columns with one
+-- row per swipe, so recording a swipe is a single indexed insert instead of a
+-- read-modify-write of an ever growing array.
+--
+-- Rollout:
+--   1. run this file (creates the table, backfills it, installs the sync trigger)
+--   2. deploy the app; it writes to swipes (and to the arrays as well while
+--      SWIPE_ARRAY_DUAL_WRITE=true, so a rollback still sees every swipe)
+--   3. once no old instances are left, the array columns can be dropped
+--
+-- seq numbers swipes in the order they were made. created_at cannot: the
+-- swipes of one batch (see 003) share their transaction's timestamp.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS swipes (
+    swiper_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    target_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    direction VARCHAR(5) NOT NULL CHECK (direction IN ('left', 'right')),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    seq BIGSERIAL,
+    PRIMARY KEY (swiper_id, target_id)
+);
+
+-- "who swiped right on me" lookups
+CREATE INDEX IF NOT EXISTS swipes_target_right_idx
+    ON swipes (target_id, swiper_id)
+    WHERE direction = 'right';
+
+-- swipes of a user made since a given time
+CREATE INDEX IF NOT EXISTS swipes_swiper_created_idx
+    ON swipes (swiper_id, created_at DESC);
+
+-- most recent swipes of a user, in the order they were made
+CREATE INDEX IF NOT EXISTS swipes_swiper_seq_idx
+    ON swipes (swiper_id, seq DESC);
+
+-- Backfill from the arrays. Right swipes go first so that an id present in
+-- both arrays is kept as a right swipe. Ids of deleted users are skipped.
+INSERT INTO swipes (swiper_id, target_id, direction)
+SELECT DISTINCT u.id, t.target_id, 'right'
+FROM users u
+CROSS JOIN LATERAL unnest(u.swipe_right) AS t(target_id)
+JOIN users target ON target.id = t.target_id
+WHERE t.target_id <> u.id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO swipes (swiper_id, target_id, direction)
+SELECT DISTINCT u.id, t.target_id, 'left'
+FROM users u
+CROSS JOIN LATERAL unnest(u.swipe_left) AS t(target_id)
+JOIN users target ON target.id = t.target_id
+WHERE t.target_id <> u.id
+ON CONFLICT DO NOTHING;
+
+-- Dual-write for instances still running the array based code: every id
+-- appended to an array is mirrored into swipes.
+CREATE OR REPLACE FUNCTION sync_swipe_arrays() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO swipes (swiper_id, target_id, direction)
+    SELECT NEW.id, t.target_id, 'right'
+    FROM unnest(NEW.swipe_right) AS t(target_id)
+    WHERE t.target_id <> NEW.id
+      AND NOT (t.target_id = ANY(COALESCE(OLD.swipe_right, '{}')))
+      AND EXISTS (SELECT 1 FROM users WHERE id = t.target_id)
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO swipes (swiper_id, target_id, direction)
+    SELECT NEW.id, t.target_id, 'left'
+    FROM unnest(NEW.swipe_left) AS t(target_id)
+    WHERE t.target_id <> NEW.id
+      AND NOT (t.target_id = ANY(COALESCE(OLD.swipe_left, '{}')))
+      AND EXISTS (SELECT 1 FROM users WHERE id = t.target_id)
+    ON CONFLICT DO NOTHING;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_swipe_arrays_sync ON users;
+CREATE TRIGGER users_swipe_arrays_sync
+    AFTER UPDATE OF swipe_right, swipe_left ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION sync_swipe_arrays();
+
+COMMIT;
@@ -0,0 +1,50 @@
+-- 002: atomic swipe-right with in-database mutual match detection
+--
+-- record_swipe_right() inserts the swipe, checks for the reverse swipe and
+-- creates the match in one call. A transaction scoped advisory lock on the
+-- (smaller id, larger id) pair serializes the two sides of a pair, so when
+-- two users swipe on each other at the same time the second call always sees
+-- the first one's committed swipe and the match is never lost. The lock is
+-- held until the caller commits.
+--
+-- status is one of 'swiped', 'already_swiped' or 'target_not_found'.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION record_swipe_right(p_swiper_id INTEGER, p_target_id INTEGER)
+RETURNS TABLE (status TEXT, is_match BOOLEAN) AS $$
+DECLARE
+    v_is_match BOOLEAN;
+BEGIN
+    PERFORM pg_advisory_xact_lock(LEAST(p_swiper_id, p_target_id), GREATEST(p_swiper_id, p_target_id));
+
+    IF NOT EXISTS (SELECT 1 FROM users WHERE id = p_target_id) THEN
+        RETURN QUERY SELECT 'target_not_found'::TEXT, FALSE;
+        RETURN;
+    END IF;
+
+    INSERT INTO swipes (swiper_id, target_id, direction)
+    VALUES (p_swiper_id, p_target_id, 'right')
+    ON CONFLICT DO NOTHING;
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'already_swiped'::TEXT, FALSE;
+        RETURN;
+    END IF;
+
+    v_is_match := EXISTS (
+        SELECT 1 FROM swipes
+        WHERE swiper_id = p_target_id AND target_id = p_swiper_id AND direction = 'right'
+    );
+
+    IF v_is_match THEN
+        INSERT INTO matches (user1_id, user2_id, matched_at)
+        VALUES (LEAST(p_swiper_id, p_target_id), GREATEST(p_swiper_id, p_target_id), NOW())
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    RETURN QUERY SELECT 'swiped'::TEXT, v_is_match;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
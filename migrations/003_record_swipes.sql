@@ -0,0 +1,71 @@
+-- 003: batched swipes
+--
+-- record_swipes() applies a list of left/right decisions of one user in a
+-- single statement and reports, per target, whether the swipe was stored and
+-- whether it produced a match. The pair locks are the same ones taken by
+-- record_swipe_right(), acquired in (smaller id, larger id) order so that
+-- overlapping batches cannot deadlock. If a target appears more than once in
+-- the batch, the last decision wins, and counts as made where it is in the
+-- batch: swipes are inserted in batch order, so their seq (see 001) follows it.
+--
+-- status is one of 'swiped', 'already_swiped' or 'target_not_found'.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION record_swipes(p_swiper_id INTEGER, p_target_ids INTEGER[], p_directions TEXT[])
+RETURNS TABLE (target_id INTEGER, status TEXT, is_match BOOLEAN) AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(pair.low_id, pair.high_id)
+    FROM (
+        SELECT DISTINCT LEAST(p_swiper_id, t.id) AS low_id, GREATEST(p_swiper_id, t.id) AS high_id
+        FROM unnest(p_target_ids) AS t(id)
+        WHERE t.id <> p_swiper_id
+        ORDER BY 1, 2
+    ) pair;
+
+    RETURN QUERY
+    WITH input AS (
+        SELECT DISTINCT ON (t.target_id) t.target_id, t.direction, t.ord
+        FROM unnest(p_target_ids, p_directions) WITH ORDINALITY AS t(target_id, direction, ord)
+        WHERE t.target_id <> p_swiper_id
+        ORDER BY t.target_id, t.ord DESC
+    ),
+    inserted AS (
+        INSERT INTO swipes (swiper_id, target_id, direction)
+        SELECT p_swiper_id, i.target_id, i.direction
+        FROM input i
+        JOIN users u ON u.id = i.target_id
+        ORDER BY i.ord
+        ON CONFLICT DO NOTHING
+        RETURNING swipes.target_id, swipes.direction
+    ),
+    mutual AS (
+        SELECT ins.target_id
+        FROM inserted ins
+        JOIN swipes back
+          ON back.swiper_id = ins.target_id
+         AND back.target_id = p_swiper_id
+         AND back.direction = 'right'
+        WHERE ins.direction = 'right'
+    ),
+    new_matches AS (
+        INSERT INTO matches (user1_id, user2_id, matched_at)
+        SELECT LEAST(p_swiper_id, m.target_id), GREATEST(p_swiper_id, m.target_id), NOW()
+        FROM mutual m
+        ON CONFLICT DO NOTHING
+    )
+    SELECT i.target_id,
+           CASE
+               WHEN ins.target_id IS NOT NULL THEN 'swiped'
+               WHEN EXISTS (SELECT 1 FROM users u WHERE u.id = i.target_id) THEN 'already_swiped'
+               ELSE 'target_not_found'
+           END,
+           m.target_id IS NOT NULL
+    FROM input i
+    LEFT JOIN inserted ins ON ins.target_id = i.target_id
+    LEFT JOIN mutual m ON m.target_id = i.target_id
+    ORDER BY i.target_id;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- 004: indexes for the paginated swipe deck
+--
+-- /match/get_others walks users in id order from a keyset cursor. Inside a
+-- collaboration the walk is driven by the membership table, so it needs an
+-- index that returns a collaboration's members in user id order. Swipe and
+-- match exclusions are served by the swipes primary key and the unique
+-- (user1_id, user2_id) constraint on matches.
+
+CREATE INDEX IF NOT EXISTS user_collaborations_collaboration_user_idx
+    ON user_collaborations (collaboration_id, user_id);
@@ -0,0 +1,83 @@
+-- 005: reverse index of inbound likes
+--
+-- inbound_likes holds one row per right swipe that has not (yet) turned into a
+-- match, keyed by the user who received it, so /match/likes is a range read
+-- over the likes a user received instead of a scan of every swipe. Triggers
+-- on swipes and matches keep it in step with every write path.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS inbound_likes (
+    target_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    liker_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    liked_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (target_id, liker_id)
+);
+
+-- newest likes first, for pagination
+CREATE INDEX IF NOT EXISTS inbound_likes_target_liked_at_idx
+    ON inbound_likes (target_id, liked_at DESC, liker_id DESC);
+
+INSERT INTO inbound_likes (target_id, liker_id, liked_at)
+SELECT s.target_id, s.swiper_id, s.created_at
+FROM swipes s
+WHERE s.direction = 'right'
+  AND NOT EXISTS (
+      SELECT 1 FROM matches m
+      WHERE m.user1_id = LEAST(s.swiper_id, s.target_id)
+        AND m.user2_id = GREATEST(s.swiper_id, s.target_id)
+  )
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION inbound_likes_on_swipe() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.direction = 'right' AND NOT EXISTS (
+            SELECT 1 FROM matches
+            WHERE user1_id = LEAST(NEW.swiper_id, NEW.target_id)
+              AND user2_id = GREATEST(NEW.swiper_id, NEW.target_id)
+        ) THEN
+            INSERT INTO inbound_likes (target_id, liker_id, liked_at)
+            VALUES (NEW.target_id, NEW.swiper_id, NEW.created_at)
+            ON CONFLICT DO NOTHING;
+        END IF;
+    ELSE
+        DELETE FROM inbound_likes WHERE target_id = OLD.target_id AND liker_id = OLD.swiper_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION inbound_likes_on_match() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        DELETE FROM inbound_likes
+        WHERE (target_id = NEW.user1_id AND liker_id = NEW.user2_id)
+           OR (target_id = NEW.user2_id AND liker_id = NEW.user1_id);
+    ELSE
+        -- The match is gone: any right swipe that is still there is a pending like again
+        INSERT INTO inbound_likes (target_id, liker_id, liked_at)
+        SELECT s.target_id, s.swiper_id, s.created_at
+        FROM swipes s
+        WHERE s.direction = 'right'
+          AND ((s.swiper_id = OLD.user1_id AND s.target_id = OLD.user2_id)
+            OR (s.swiper_id = OLD.user2_id AND s.target_id = OLD.user1_id))
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS swipes_inbound_likes ON swipes;
+CREATE TRIGGER swipes_inbound_likes
+    AFTER INSERT OR DELETE ON swipes
+    FOR EACH ROW
+    EXECUTE FUNCTION inbound_likes_on_swipe();
+
+DROP TRIGGER IF EXISTS matches_inbound_likes ON matches;
+CREATE TRIGGER matches_inbound_likes
+    AFTER INSERT OR DELETE ON matches
+    FOR EACH ROW
+    EXECUTE FUNCTION inbound_likes_on_match();
+
+COMMIT;
@@ -0,0 +1,47 @@
+-- 006: per-user match adjacency
+--
+-- matches stores a pair once as (smaller id, larger id), so "matches of user
+-- X" has to look at both columns. match_edges stores every match twice, once
+-- from each side, so the same question is a single range read on
+-- (user_id, ...). It is maintained by a trigger on matches.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS match_edges (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    other_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    match_id INTEGER NOT NULL REFERENCES matches(id) ON DELETE CASCADE,
+    matched_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, other_id)
+);
+
+-- newest matches first, for pagination
+CREATE INDEX IF NOT EXISTS match_edges_user_matched_at_idx
+    ON match_edges (user_id, matched_at DESC, other_id DESC);
+
+INSERT INTO match_edges (user_id, other_id, match_id, matched_at)
+SELECT m.user1_id, m.user2_id, m.id, COALESCE(m.matched_at, CURRENT_TIMESTAMP) FROM matches m
+UNION ALL
+SELECT m.user2_id, m.user1_id, m.id, COALESCE(m.matched_at, CURRENT_TIMESTAMP) FROM matches m
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION match_edges_on_match() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO match_edges (user_id, other_id, match_id, matched_at)
+        VALUES (NEW.user1_id, NEW.user2_id, NEW.id, COALESCE(NEW.matched_at, CURRENT_TIMESTAMP)),
+               (NEW.user2_id, NEW.user1_id, NEW.id, COALESCE(NEW.matched_at, CURRENT_TIMESTAMP))
+        ON CONFLICT DO NOTHING;
+    END IF;
+    -- Deletes cascade through match_edges.match_id
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS matches_match_edges ON matches;
+CREATE TRIGGER matches_match_edges
+    AFTER INSERT ON matches
+    FOR EACH ROW
+    EXECUTE FUNCTION match_edges_on_match();
+
+COMMIT;
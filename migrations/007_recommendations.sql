@@ -0,0 +1,19 @@
+-- 007: offline "people like you swiped on" recommendations
+--
+-- Filled by `flask build-recommendations` (app/recommendations.py): the top
+-- candidates of every user with their collaborative filtering score. Read by
+-- /match/get_others?mode=recommended, best score first.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS recommendations (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    candidate_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    score REAL NOT NULL,
+    PRIMARY KEY (user_id, candidate_id)
+);
+
+CREATE INDEX IF NOT EXISTS recommendations_user_score_idx
+    ON recommendations (user_id, score DESC, candidate_id);
+
+COMMIT;
@@ -0,0 +1,36 @@
+-- 008: active user pool
+--
+-- users.last_active is now written by the app (see app/activity.py), at most
+-- once every few minutes per user, and candidate queries only look at users
+-- active in the last 30 days. The deck walks users in id order, so the index
+-- is keyed on id and carries last_active: the walk becomes an index-only scan
+-- that checks activity without touching the table, and accounts that never
+-- logged in since last_active was introduced are not in the index at all. A
+-- partial index on "active in the last 30 days" is not possible because the
+-- predicate would have to use now().
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS users_active_pool_idx
+    ON users (id, last_active)
+    WHERE last_active IS NOT NULL;
+
+-- Seed last_active from the activity we already have, so existing users do
+-- not drop out of every deck until they next log in. Swipes backfilled by
+-- 001 carry the time that migration ran, which makes their swipers look
+-- active for one more window at most.
+UPDATE users u
+SET last_active = a.last_seen
+FROM (
+    SELECT user_id, MAX(seen_at) AS last_seen
+    FROM (
+        SELECT swiper_id AS user_id, created_at AS seen_at FROM swipes
+        UNION ALL
+        SELECT sender_id, sent_at FROM chats WHERE sent_at IS NOT NULL
+    ) activity
+    GROUP BY user_id
+) a
+WHERE a.user_id = u.id
+  AND (u.last_active IS NULL OR u.last_active < a.last_seen);
+
+COMMIT;
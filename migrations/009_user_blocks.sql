@@ -0,0 +1,23 @@
+-- 009: blocks and mutes
+--
+-- One row per (blocker, blocked) pair. A block hides the two users from each
+-- other everywhere (decks, likes, matches, chat); a mute only hides the muted
+-- user from the muter's decks and likes and stops live delivery of their
+-- messages. Blocking a muted user turns the mute into a block.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS user_blocks (
+    blocker_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    blocked_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL CHECK (kind IN ('block', 'mute')),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (blocker_id, blocked_id),
+    CHECK (blocker_id <> blocked_id)
+);
+
+-- who blocked me, for the reverse side of a block
+CREATE INDEX IF NOT EXISTS user_blocks_blocked_idx
+    ON user_blocks (blocked_id, blocker_id);
+
+COMMIT;
@@ -0,0 +1,26 @@
+-- 010: profile boosts
+--
+-- A boost puts a user's card at the front of other users' decks for a while.
+-- Active boosts are held in memory by every process (see app/boosts.py); this
+-- table is what they are loaded from, and the history /match/profile_boosts
+-- lists.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS profile_boosts (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    weight REAL NOT NULL DEFAULT 1 CHECK (weight > 0),
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- a user's boosts, newest first
+CREATE INDEX IF NOT EXISTS profile_boosts_user_started_idx
+    ON profile_boosts (user_id, started_at DESC);
+
+-- active boosts, for loading
+CREATE INDEX IF NOT EXISTS profile_boosts_expires_idx
+    ON profile_boosts (expires_at);
+
+COMMIT;
@@ -0,0 +1,75 @@
+-- 011: swipe undo
+--
+-- undo_swipe() deletes one of a user's most recent swipes and, for a right
+-- swipe, the match it created, in one call. It takes the same pair lock as
+-- record_swipe_right() and record_swipes(), so an undo cannot interleave with
+-- the other user swiping back. Only a swipe among the user's p_depth newest
+-- ones, in seq order, can be undone; that check is a bounded read of
+-- swipes_swiper_seq_idx (see 001), so it costs the same however many swipes
+-- the user made. The inbound_likes and match_edges triggers follow the deletes:
+-- the other user's like becomes a pending like again.
+--
+-- Every undo is also logged in swipe_undos, so the exclusion sets of other
+-- processes (see app/exclusions.py) take the user back out on their next
+-- catch-up. Entries older than 7 days are pruned by undo_swipe() itself; a set
+-- that has not been caught up for longer than that is read again in full.
+--
+-- status is one of 'undone' or 'not_recent'.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS swipe_undos (
+    swiper_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    target_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    undone_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- a user's undos since the last catch-up of their exclusion set
+CREATE INDEX IF NOT EXISTS swipe_undos_swiper_undone_idx
+    ON swipe_undos (swiper_id, undone_at);
+
+-- expired undos, for pruning
+CREATE INDEX IF NOT EXISTS swipe_undos_undone_idx
+    ON swipe_undos (undone_at);
+
+CREATE OR REPLACE FUNCTION undo_swipe(p_swiper_id INTEGER, p_target_id INTEGER, p_depth INTEGER)
+RETURNS TABLE (status TEXT, swipe_direction TEXT, was_match BOOLEAN) AS $$
+DECLARE
+    v_direction TEXT;
+    v_was_match BOOLEAN := FALSE;
+BEGIN
+    PERFORM pg_advisory_xact_lock(LEAST(p_swiper_id, p_target_id), GREATEST(p_swiper_id, p_target_id));
+
+    IF NOT EXISTS (
+        SELECT 1
+        FROM (
+            SELECT s.target_id FROM swipes s
+            WHERE s.swiper_id = p_swiper_id
+            ORDER BY s.seq DESC
+            LIMIT p_depth
+        ) recent
+        WHERE recent.target_id = p_target_id
+    ) THEN
+        RETURN QUERY SELECT 'not_recent'::TEXT, NULL::TEXT, FALSE;
+        RETURN;
+    END IF;
+
+    DELETE FROM swipes
+    WHERE swipes.swiper_id = p_swiper_id AND swipes.target_id = p_target_id
+    RETURNING swipes.direction INTO v_direction;
+
+    IF v_direction = 'right' THEN
+        DELETE FROM matches
+        WHERE user1_id = LEAST(p_swiper_id, p_target_id)
+          AND user2_id = GREATEST(p_swiper_id, p_target_id);
+        v_was_match := FOUND;
+    END IF;
+
+    INSERT INTO swipe_undos (swiper_id, target_id) VALUES (p_swiper_id, p_target_id);
+    DELETE FROM swipe_undos WHERE undone_at < LOCALTIMESTAMP - INTERVAL '7 days';
+
+    RETURN QUERY SELECT 'undone'::TEXT, v_direction, v_was_match;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,126 @@
+-- 012: incrementally maintained user statistics
+--
+-- user_stats holds one row of counters per user, so /match/match_statistics
+-- and the profile_views routes read a row instead of aggregating swipes and
+-- matches on every request. Swipe and match counters are kept by statement
+-- level triggers: a batch of swipes (see 003) updates each affected user's
+-- row once, in user id order so concurrent batches cannot deadlock.
+--
+-- profile_views, and swipes_received / right_swipes_received for new swipes,
+-- are not touched by triggers: the app buffers them in memory and adds them
+-- in batches (see app/stats.py), so a popular profile costs one row update
+-- every few seconds instead of one per view or swipe, and users swiping on it
+-- do not queue on its row lock inside their swipe transactions. Deletes
+-- (undone swipes, deleted users) are rare and adjust both sides here. Swipes
+-- inserted by instances running the array based code (see 001) are not
+-- counted as received.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    swipes_given INTEGER NOT NULL DEFAULT 0,
+    right_swipes_given INTEGER NOT NULL DEFAULT 0,
+    swipes_received INTEGER NOT NULL DEFAULT 0,
+    right_swipes_received INTEGER NOT NULL DEFAULT 0,
+    matches INTEGER NOT NULL DEFAULT 0,
+    profile_views BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO user_stats (user_id, swipes_given, right_swipes_given, swipes_received, right_swipes_received, matches)
+SELECT u.id,
+       COALESCE(g.swipes, 0), COALESCE(g.right_swipes, 0),
+       COALESCE(r.swipes, 0), COALESCE(r.right_swipes, 0),
+       COALESCE(m.matches, 0)
+FROM users u
+LEFT JOIN (
+    SELECT swiper_id AS user_id, COUNT(*) AS swipes, COUNT(*) FILTER (WHERE direction = 'right') AS right_swipes
+    FROM swipes GROUP BY swiper_id
+) g ON g.user_id = u.id
+LEFT JOIN (
+    SELECT target_id AS user_id, COUNT(*) AS swipes, COUNT(*) FILTER (WHERE direction = 'right') AS right_swipes
+    FROM swipes GROUP BY target_id
+) r ON r.user_id = u.id
+LEFT JOIN (
+    SELECT user_id, COUNT(*) AS matches FROM match_edges GROUP BY user_id
+) m ON m.user_id = u.id
+ON CONFLICT (user_id) DO NOTHING;
+
+-- Both triggers of a table expose the rows they saw as "changed" (inserted
+-- rows for the insert trigger, deleted rows for the delete trigger), so one
+-- function serves both and only the sign of the change differs, except that
+-- inserts leave the received counters to the app.
+CREATE OR REPLACE FUNCTION user_stats_on_swipes() RETURNS trigger AS $$
+DECLARE
+    v_sign INTEGER := CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END;
+BEGIN
+    INSERT INTO user_stats AS s (user_id, swipes_given, right_swipes_given, swipes_received, right_swipes_received)
+    SELECT d.user_id, v_sign * SUM(d.given), v_sign * SUM(d.right_given), v_sign * SUM(d.received), v_sign * SUM(d.right_received)
+    FROM (
+        SELECT c.swiper_id AS user_id, 1 AS given, (c.direction = 'right')::INT AS right_given,
+               0 AS received, 0 AS right_received
+        FROM changed c
+        UNION ALL
+        SELECT c.target_id, 0, 0, 1, (c.direction = 'right')::INT
+        FROM changed c
+        WHERE TG_OP = 'DELETE'
+    ) d
+    GROUP BY d.user_id
+    ORDER BY d.user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET swipes_given = s.swipes_given + EXCLUDED.swipes_given,
+        right_swipes_given = s.right_swipes_given + EXCLUDED.right_swipes_given,
+        swipes_received = s.swipes_received + EXCLUDED.swipes_received,
+        right_swipes_received = s.right_swipes_received + EXCLUDED.right_swipes_received;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_stats_on_matches() RETURNS trigger AS $$
+DECLARE
+    v_sign INTEGER := CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END;
+BEGIN
+    INSERT INTO user_stats AS s (user_id, matches)
+    SELECT d.user_id, v_sign * COUNT(*)
+    FROM (
+        SELECT c.user1_id AS user_id FROM changed c
+        UNION ALL
+        SELECT c.user2_id FROM changed c
+    ) d
+    GROUP BY d.user_id
+    ORDER BY d.user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET matches = s.matches + EXCLUDED.matches;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS swipes_user_stats_insert ON swipes;
+CREATE TRIGGER swipes_user_stats_insert
+    AFTER INSERT ON swipes
+    REFERENCING NEW TABLE AS changed
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION user_stats_on_swipes();
+
+DROP TRIGGER IF EXISTS swipes_user_stats_delete ON swipes;
+CREATE TRIGGER swipes_user_stats_delete
+    AFTER DELETE ON swipes
+    REFERENCING OLD TABLE AS changed
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION user_stats_on_swipes();
+
+DROP TRIGGER IF EXISTS matches_user_stats_insert ON matches;
+CREATE TRIGGER matches_user_stats_insert
+    AFTER INSERT ON matches
+    REFERENCING NEW TABLE AS changed
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION user_stats_on_matches();
+
+DROP TRIGGER IF EXISTS matches_user_stats_delete ON matches;
+CREATE TRIGGER matches_user_stats_delete
+    AFTER DELETE ON matches
+    REFERENCING OLD TABLE AS changed
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION user_stats_on_matches();
+
+COMMIT;
@@ -0,0 +1,17 @@
+-- 013: recently viewed profiles
+--
+-- One row per user with the ids of the profiles they opened, most recent
+-- first, without duplicates and capped at a few hundred ids (see
+-- app/history.py for the cap). Views are buffered by the app and merged into
+-- the array in batches: the new ids go in front and their older occurrences
+-- are dropped, so the row never grows past the cap.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS recently_viewed (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    viewed_ids INTEGER[] NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMIT;
@@ -0,0 +1,28 @@
+-- 014: conversation index for chat history
+--
+-- A conversation is the unordered pair of its two users, so every message of
+-- it has the same (LEAST(sender_id, receiver_id), GREATEST(sender_id,
+-- receiver_id)). Indexing that expression with the send time turns a page of
+-- /chat/history into one backward range scan that stops after `limit` rows,
+-- instead of an OR of the two directions that reads and sorts the whole
+-- conversation. The message text is left out of the index; a page costs at
+-- most `limit` heap fetches.
+--
+-- Pages are ordered by (sent_at, id), not by id alone: ids are taken in
+-- blocks by each worker (see app/chat_writer.py), so across workers a larger
+-- id is not always a later message. `before=<message id>` is the page cursor;
+-- the query looks up that message's (sent_at, id) and scans backwards from it.
+--
+-- Every insert sets sent_at or gets its default; rows without one are given
+-- the time of the migration, so the column can be NOT NULL and the row
+-- comparison of the cursor never meets a NULL.
+
+BEGIN;
+
+UPDATE chats SET sent_at = CURRENT_TIMESTAMP WHERE sent_at IS NULL;
+ALTER TABLE chats ALTER COLUMN sent_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS chats_conversation_idx
+    ON chats (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), sent_at DESC, id DESC);
+
+COMMIT;
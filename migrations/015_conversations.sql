@@ -0,0 +1,80 @@
+-- 015: conversation list
+--
+-- conversations holds one row per participant of every conversation, like
+-- match_edges does for matches, with the conversation's last message and how
+-- many messages that participant has not read. The inbox of a user is then a
+-- single range read on (user_id, last_sent_at DESC) instead of a GROUP BY
+-- over chats. A statement level trigger on chats keeps the rows up to date:
+-- a batch of messages written by the chat writer (see app/chat_writer.py)
+-- updates each affected row once, in key order.
+--
+-- Messages are ordered by (sent_at, id): ids are taken in blocks by each
+-- worker, so across workers a larger id is not always a later message.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS conversations (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    other_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    last_message_id INTEGER NOT NULL,
+    last_sender_id INTEGER NOT NULL,
+    last_sent_at TIMESTAMP NOT NULL,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    last_read_message_id INTEGER,
+    PRIMARY KEY (user_id, other_id)
+);
+
+-- most recently active conversations first, for pagination
+CREATE INDEX IF NOT EXISTS conversations_user_last_sent_idx
+    ON conversations (user_id, last_sent_at DESC, other_id DESC);
+
+-- Existing conversations start with nothing unread, since no read state was kept
+INSERT INTO conversations (user_id, other_id, last_message_id, last_sender_id, last_sent_at)
+SELECT DISTINCT ON (e.user_id, e.other_id) e.user_id, e.other_id, e.id, e.sender_id, e.sent_at
+FROM (
+    SELECT sender_id AS user_id, receiver_id AS other_id, id, sender_id, COALESCE(sent_at, CURRENT_TIMESTAMP) AS sent_at FROM chats
+    UNION ALL
+    SELECT receiver_id, sender_id, id, sender_id, COALESCE(sent_at, CURRENT_TIMESTAMP) FROM chats
+) e
+WHERE e.user_id <> e.other_id
+ORDER BY e.user_id, e.other_id, e.sent_at DESC, e.id DESC
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION conversations_on_chats() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO conversations AS c (user_id, other_id, last_message_id, last_sender_id, last_sent_at, unread_count)
+    SELECT e.user_id, e.other_id,
+           (array_agg(e.id ORDER BY e.sent_at DESC, e.id DESC))[1],
+           (array_agg(e.sender_id ORDER BY e.sent_at DESC, e.id DESC))[1],
+           MAX(e.sent_at),
+           COUNT(*) FILTER (WHERE e.incoming)
+    FROM (
+        SELECT n.sender_id AS user_id, n.receiver_id AS other_id, n.id, n.sender_id,
+               COALESCE(n.sent_at, CURRENT_TIMESTAMP) AS sent_at, FALSE AS incoming
+        FROM new_chats n
+        UNION ALL
+        SELECT n.receiver_id, n.sender_id, n.id, n.sender_id, COALESCE(n.sent_at, CURRENT_TIMESTAMP), TRUE
+        FROM new_chats n
+    ) e
+    WHERE e.user_id <> e.other_id
+    GROUP BY e.user_id, e.other_id
+    ORDER BY e.user_id, e.other_id
+    ON CONFLICT (user_id, other_id) DO UPDATE
+    SET last_message_id = CASE WHEN (EXCLUDED.last_sent_at, EXCLUDED.last_message_id) > (c.last_sent_at, c.last_message_id)
+                               THEN EXCLUDED.last_message_id ELSE c.last_message_id END,
+        last_sender_id = CASE WHEN (EXCLUDED.last_sent_at, EXCLUDED.last_message_id) > (c.last_sent_at, c.last_message_id)
+                              THEN EXCLUDED.last_sender_id ELSE c.last_sender_id END,
+        last_sent_at = GREATEST(c.last_sent_at, EXCLUDED.last_sent_at),
+        unread_count = c.unread_count + EXCLUDED.unread_count;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS chats_conversations ON chats;
+CREATE TRIGGER chats_conversations
+    AFTER INSERT ON chats
+    REFERENCING NEW TABLE AS new_chats
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION conversations_on_chats();
+
+COMMIT;
@@ -0,0 +1,52 @@
+-- 016: resumable chat sync
+--
+-- chats.seq numbers messages in commit order, so a client that has seen
+-- everything up to some seq can ask for exactly the messages after it
+-- (/chat/sync and the 'sync' socket event) instead of refetching the
+-- history of every conversation. chats.id cannot serve as that cursor:
+-- workers reserve ids in blocks before writing (see app/chat_writer.py), so
+-- a message with a smaller id can commit after one with a larger id and
+-- would be skipped by a client that already moved past it.
+--
+-- A statement level trigger takes a transaction scoped advisory lock before
+-- every insert into chats, so inserting transactions take their seq values
+-- and commit one after the other. The chat writer inserts whole batches, so
+-- this is one short wait per batch, not per message.
+--
+-- The backfill rewrites every row of chats; run it off-peak on a large table.
+
+BEGIN;
+
+CREATE SEQUENCE IF NOT EXISTS chats_seq_seq AS BIGINT;
+
+ALTER TABLE chats ADD COLUMN IF NOT EXISTS seq BIGINT;
+
+UPDATE chats c
+SET seq = o.seq
+FROM (SELECT id, row_number() OVER (ORDER BY id) AS seq FROM chats) o
+WHERE c.id = o.id AND c.seq IS NULL;
+
+SELECT setval('chats_seq_seq', COALESCE((SELECT MAX(seq) FROM chats), 0) + 1, false);
+
+ALTER SEQUENCE chats_seq_seq OWNED BY chats.seq;
+ALTER TABLE chats ALTER COLUMN seq SET DEFAULT nextval('chats_seq_seq');
+ALTER TABLE chats ALTER COLUMN seq SET NOT NULL;
+
+-- messages received / sent by a user after a given seq
+CREATE INDEX IF NOT EXISTS chats_receiver_seq_idx ON chats (receiver_id, seq);
+CREATE INDEX IF NOT EXISTS chats_sender_seq_idx ON chats (sender_id, seq);
+
+CREATE OR REPLACE FUNCTION chats_lock_seq() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('chats.seq'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS chats_seq_order ON chats;
+CREATE TRIGGER chats_seq_order
+    BEFORE INSERT ON chats
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION chats_lock_seq();
+
+COMMIT;